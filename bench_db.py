@@ -0,0 +1,134 @@
+"""
+Benchmark lecture/écriture concurrente sur la base SQLite.
+
+Compare le profil historique (journal DELETE, synchronous FULL) au profil
+configuré dans database.SQLITE_PRAGMAS (WAL par défaut) avec plusieurs
+threads lecteurs et écrivains, comme lors d'une journée de distribution.
+
+Usage: python bench_db.py [--readers 8] [--writers 4] [--duration 5]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+
+LEGACY_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+}
+
+
+def prepare_database(db_path):
+    """Crée le schéma et quelques articles d'inventaire"""
+    previous_path = database.DB_PATH
+    database.DB_PATH = db_path
+    try:
+        database.init_db()
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            for i in range(200):
+                cur.execute("""
+                    INSERT INTO inventory (item_name, quantity, unit, min_quantity)
+                    VALUES (%s, %s, %s, %s)
+                """, (f"Article {i}", 1000, 'pièces', 10))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+    finally:
+        database.get_pool().close_all()
+        database.DB_PATH = previous_path
+
+
+def run_profile(db_path, pragmas, readers, writers, duration):
+    pool = database.ConnectionPool(db_path, max_idle=readers + writers, pragmas=pragmas)
+    counters = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def reader():
+        done = 0
+        while time.monotonic() < stop_at:
+            conn = database.Connection(pool.acquire(), pool)
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT id, item_name, quantity, unit
+                    FROM inventory
+                    ORDER BY item_name
+                """)
+                cur.fetchall()
+                done += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    counters['locked'] += 1
+            finally:
+                conn.close()
+        with lock:
+            counters['reads'] += done
+
+    def writer(worker_id):
+        done = 0
+        while time.monotonic() < stop_at:
+            conn = database.Connection(pool.acquire(), pool)
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE inventory
+                    SET quantity = quantity - 1
+                    WHERE id = %s
+                """, ((done + worker_id) % 200 + 1,))
+                conn.commit()
+                done += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    counters['locked'] += 1
+            finally:
+                conn.close()
+        with lock:
+            counters['writes'] += done
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close_all()
+
+    return {
+        'reads/s': counters['reads'] / duration,
+        'writes/s': counters['writes'] / duration,
+        'locked': counters['locked'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    profiles = [
+        ('historique', LEGACY_PRAGMAS),
+        ('configuré', database.SQLITE_PRAGMAS),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, pragmas in profiles:
+            db_path = os.path.join(tmp_dir, f"bench_{label}.db")
+            prepare_database(db_path)
+            result = run_profile(db_path, pragmas, args.readers, args.writers, args.duration)
+            print(f"{label:<12} lectures/s: {result['reads/s']:>10.1f}   "
+                  f"écritures/s: {result['writes/s']:>10.1f}   verrous: {result['locked']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Contrôle de non-régression des plans d'exécution SQLite.
+
+Crée une base temporaire au dernier schéma (database.migrate), puis vérifie
+avec EXPLAIN QUERY PLAN que les requêtes principales des modèles utilisent
+l'index attendu au lieu de parcourir toute la table. Le script retourne un
+code d'erreur si un plan régresse, pour être lancé avant une livraison.
+
+Usage: python check_query_plans.py [-v]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import database
+from models.Inventory import Inventory
+from models.User import User, _USER_DELETE_CASCADE
+
+
+def _cascade(key):
+    """Instruction de nettoyage de User.bulk_delete pour la clé donnée"""
+    table, condition = next((table, condition) for name, table, condition in _USER_DELETE_CASCADE
+                            if name == key)
+    return f"DELETE FROM {table} WHERE {condition}"
+
+
+# (description, requête telle qu'écrite dans les modèles, paramètres, index attendu).
+# Les requêtes construites dynamiquement viennent des modèles eux-mêmes
+# (_page_query, _USER_DELETE_CASCADE) pour ne pas diverger du code exécuté.
+QUERY_PLANS = [
+    (
+        "Équipements en cours d'un utilisateur",
+        """
+        SELECT id, inventory_id, user_id, quantity, assigned_at
+        FROM equipment_assignments
+        WHERE user_id = %s AND returned_at IS NULL
+        ORDER BY assigned_at DESC
+        """,
+        (1,), 'idx_equipment_assignments_user',
+    ),
+    (
+        "Équipements des enfants d'un parent",
+        """
+        SELECT i.id, i.item_name, i.category, i.quantity, i.unit, i.min_quantity,
+               u.id, u.name, u.email, u.password_hash, u.status, u.first_name, u.rank,
+               ea.id, ea.quantity, ea.assigned_at
+        FROM parent_child pc
+        JOIN users u ON u.id = pc.child_id
+        JOIN equipment_assignments ea ON ea.user_id = u.id AND ea.returned_at IS NULL
+        JOIN inventory i ON i.id = ea.inventory_id
+        WHERE pc.parent_id = %s
+        ORDER BY i.category, i.item_name, u.name, ea.assigned_at DESC
+        """,
+        (1,), 'idx_equipment_assignments_user',
+    ),
+    (
+        "Liens parent-enfant d'un compte supprimé",
+        _cascade('parent_child'),
+        (), 'idx_parent_child_child',
+    ),
+    (
+        "Présences d'un compte supprimé",
+        _cascade('attendance'),
+        (), 'idx_attendance_user',
+    ),
+    (
+        "Notes d'un cadet",
+        """
+        SELECT n.id, n.user_id, n.note_date, n.note_type, n.rating, n.appreciation,
+               n.evaluator_id, COALESCE(u.name, 'Utilisateur supprimé') as evaluator_name
+        FROM user_notes n
+        LEFT JOIN users u ON n.evaluator_id = u.id
+        WHERE n.user_id = %s
+        ORDER BY n.note_date DESC
+        """,
+        (1,), 'idx_user_notes_user_date',
+    ),
+    (
+        "Page d'utilisateurs",
+        *User._page_query(('Nom', 1)),
+        'idx_users_name',
+    ),
+    (
+        "Utilisateurs par statut",
+        """
+        SELECT id, name, email, password_hash, status, first_name, rank
+        FROM users
+        WHERE status IN (%s, %s)
+        ORDER BY name
+        """,
+        ('cadet', 'AMC'), 'idx_users_status_name',
+    ),
+    (
+        "Page d'inventaire",
+        *Inventory._page_query(('', 'Article', 1)),
+        'idx_inventory_listing',
+    ),
+    (
+        "Page d'inventaire d'une catégorie",
+        *Inventory._page_query(('Tenue', 'Article', 1), category='Tenue'),
+        'idx_inventory_listing',
+    ),
+    (
+        "Demandes d'équipement en attente",
+        """
+        SELECT id, user_id, equipment_id, request_type, quantity, reason,
+               status, created_at, processed_at, processed_by, rejection_reason
+        FROM equipment_requests
+        WHERE status = 'pending'
+        ORDER BY created_at DESC
+        """,
+        (), 'idx_equipment_requests_status',
+    ),
+    (
+        "Champs d'une catégorie",
+        """
+        SELECT id, category_id, field_name, field_type, required
+        FROM category_fields
+        WHERE category_id = %s
+        ORDER BY field_name
+        """,
+        (1,), 'idx_category_fields_category',
+    ),
+]
+
+
+def query_plan(cur, query, params):
+    cur.execute("EXPLAIN QUERY PLAN " + query, params)
+    return [row['detail'] for row in cur.fetchall()]
+
+
+def check_plans(verbose=False):
+    """Retourne la liste des requêtes dont le plan n'utilise pas l'index attendu"""
+    failures = []
+    conn = database.get_connection()
+    cur = conn.cursor()
+    try:
+        # Table des identifiants lue par les instructions de User.bulk_delete
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_delete_ids (id INTEGER PRIMARY KEY)")
+        for description, query, params, index in QUERY_PLANS:
+            plan = query_plan(cur, query, params)
+            ok = any(index in detail for detail in plan)
+            if verbose or not ok:
+                print(f"{'OK ' if ok else 'KO '} {description} (attendu: {index})")
+                for detail in plan:
+                    print(f"      {detail}")
+            if not ok:
+                failures.append(description)
+    finally:
+        cur.close()
+        conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--verbose', action='store_true', help="affiche tous les plans")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database.DB_PATH = os.path.join(tmp_dir, 'plans.db')
+        try:
+            database.init_db()
+            failures = check_plans(args.verbose)
+        finally:
+            database.get_pool().close_all()
+
+    if failures:
+        print(f"{len(failures)} plan(s) en régression sur {len(QUERY_PLANS)}")
+        return 1
+    print(f"{len(QUERY_PLANS)} plans conformes (schéma v{database.SCHEMA_VERSION})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
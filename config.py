@@ -27,11 +27,18 @@ class Config:
     # Mail Configuration - Azure SMTP
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.office365.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
-    MAIL_USE_TLS = True
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USE_SSL = False
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME', 'noreply@example.com'))
+
+    # File d'envoi : messages par connexion SMTP, tentatives, délai initial
+    # entre deux tentatives (doublé à chaque échec) et envois par minute par domaine
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_DELAY = int(os.environ.get('MAIL_RETRY_DELAY', 60))
+    MAIL_DOMAIN_RATE_LIMIT = int(os.environ.get('MAIL_DOMAIN_RATE_LIMIT', 30))
     
     # File Upload Configuration
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
@@ -1,7 +1,11 @@
 import os
 import sqlite3
 import logging
+import functools
 import json
+import re
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 # Emplacement de la base de données SQLite
@@ -11,6 +15,22 @@ if os.path.exists('/app/data'):
 else:
     DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cadets.db')
 
+# Nombre maximum de connexions inactives conservées par le pool
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+
+# Profil de connexion appliqué une fois à chaque connexion du pool.
+# Le mode WAL permet aux lecteurs de ne plus être bloqués par un écrivain,
+# busy_timeout fait patienter les écrivains concurrents au lieu d'échouer
+# immédiatement avec "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('DB_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('DB_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.environ.get('DB_CACHE_SIZE', -20000)),  # négatif = en Kio
+    'mmap_size': int(os.environ.get('DB_MMAP_SIZE', 128 * 1024 * 1024)),
+    'temp_store': os.environ.get('DB_TEMP_STORE', 'MEMORY'),
+    'busy_timeout': int(os.environ.get('DB_BUSY_TIMEOUT', 5000)),  # en millisecondes
+}
+
 class DictCursor:
     def __init__(self, cursor):
         self.cursor = cursor
@@ -27,9 +47,28 @@ class DictCursor:
             for i, description in enumerate(self.cursor.description)
         }
 
+class Row(sqlite3.Row):
+    """Ligne de résultat accessible par index (row[0]) ou par nom (row['id']).
+
+    Les valeurs restent dans la ligne SQLite : aucun dictionnaire n'est
+    construit par ligne, et User(*row) déballe bien les valeurs.
+    """
+
+    __slots__ = ()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (IndexError, KeyError):
+            return default
+
+    def __repr__(self):
+        return f"Row({', '.join(f'{key}={self[key]!r}' for key in self.keys())})"
+
 class Connection:
-    def __init__(self, conn):
+    def __init__(self, conn, pool=None):
         self.conn = conn
+        self.pool = pool
     
     def cursor(self):
         return Cursor(self.conn.cursor())
@@ -41,133 +80,132 @@ class Connection:
         return self.conn.rollback()
     
     def close(self):
-        return self.conn.close()
-
-class Cursor:
-    def __init__(self, cursor):
-        self.cursor = cursor
-        self.rows = None
-    
-    def execute(self, query, params=None):
-        # Convertir la requête de type PostgreSQL/MySQL en SQLite
-        query = query.replace('%s', '?')
-        query = query.replace('RETURNING id', '')
-        
-        if params is None:
-            self.cursor.execute(query)
-        else:
-            self.cursor.execute(query, params)
-        
-        return self
-    
-    def fetchone(self):
-        row = self.cursor.fetchone()
-        if row is None:
-            return None
-        return {
-            description[0]: row[i]
-            for i, description in enumerate(self.cursor.description)
-        }
-    
-    def fetchall(self):
-        rows = self.cursor.fetchall()
-        result = []
-        for row in rows:
-            result.append({
-                description[0]: row[i]
-                for i, description in enumerate(self.cursor.description)
-            })
-        return result
-    
-    def close(self):
-        return self.cursor.close()
-    
-    @property
-    def rowcount(self):
-        return self.cursor.rowcount
+        if self.pool is None:
+            return self.conn.close()
+        # Connexion issue du pool : on la rend au lieu de la fermer
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
     
-    def __iter__(self):
-        self.rows = self.fetchall()
-        self.index = 0
+    def __enter__(self):
         return self
     
-    def __next__(self):
-        if self.rows is None or self.index >= len(self.rows):
-            raise StopIteration
-        row = self.rows[self.index]
-        self.index += 1
-        return row
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+        return False
 
-# Emplacement de la base de données SQLite
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cadets.db')
+# Couche de dialecte SQL : les modèles sont écrits avec la syntaxe
+# PostgreSQL/MySQL (%s, NOW(), RETURNING). Chaque requête distincte n'est
+# traduite qu'une fois, le résultat est conservé dans un cache LRU.
+NATIVE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+STATEMENT_CACHE_SIZE = 512
 
-class DictCursor:
-    def __init__(self, cursor):
-        self.cursor = cursor
-    
-    def __iter__(self):
-        return self
-    
-    def __next__(self):
-        row = self.cursor.__next__()
-        if row is None:
-            raise StopIteration
-        return {
-            description[0]: row[i]
-            for i, description in enumerate(self.cursor.description)
-        }
+_RETURNING_RE = re.compile(r'\s+RETURNING\s+(.+?)\s*;?\s*$', re.IGNORECASE | re.DOTALL)
+_INSERT_TABLE_RE = re.compile(r'^\s*INSERT\s+(?:OR\s+\w+\s+)?INTO\s+(\w+)', re.IGNORECASE)
+_NOW_RE = re.compile(r'\bNOW\(\)', re.IGNORECASE)
 
-class Connection:
-    def __init__(self, conn):
-        self.conn = conn
-    
-    def cursor(self):
-        return Cursor(self.conn.cursor())
-    
-    def commit(self):
-        return self.conn.commit()
-    
-    def rollback(self):
-        return self.conn.rollback()
-    
-    def close(self):
-        return self.conn.close()
+class Statement:
+    """Requête traduite pour SQLite, avec la façon d'obtenir ses lignes RETURNING"""
+
+    __slots__ = ('sql', 'returning', 'native_returning', 'insert_table')
+
+    def __init__(self, sql, returning=None, native_returning=False, insert_table=None):
+        self.sql = sql
+        self.returning = returning
+        self.native_returning = native_returning
+        self.insert_table = insert_table
+
+    def returned_rows(self, cursor):
+        """Lignes produites par la clause RETURNING, lues ou émulées"""
+        if self.native_returning:
+            # Lire tout de suite : la requête est terminée avant un éventuel commit()
+            return cursor.fetchall()
+        if self.insert_table:
+            if cursor.rowcount == 0:
+                # INSERT OR IGNORE / ON CONFLICT DO NOTHING sans insertion
+                return []
+            cursor.execute(
+                f"SELECT {self.returning} FROM {self.insert_table} WHERE rowid = ?",
+                (cursor.lastrowid,)
+            )
+            return cursor.fetchall()
+        # UPDATE / DELETE : une ligne si au moins un enregistrement a été modifié
+        cursor.execute("SELECT changes() AS changes")
+        return [row for row in cursor.fetchall() if row[0] > 0]
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def translate_query(query):
+    """Traduit une requête PostgreSQL/MySQL en Statement SQLite"""
+    sql = query.replace('%s', '?')
+    sql = _NOW_RE.sub('CURRENT_TIMESTAMP', sql)
+
+    match = _RETURNING_RE.search(sql)
+    if match is None:
+        return Statement(sql)
+    if NATIVE_RETURNING:
+        return Statement(sql, match.group(1), native_returning=True)
+
+    table = _INSERT_TABLE_RE.match(sql)
+    return Statement(
+        sql[:match.start()],
+        match.group(1),
+        insert_table=table.group(1) if table else None
+    )
 
 class Cursor:
     def __init__(self, cursor):
         self.cursor = cursor
-        self.rows = None
+        self.returned = None
     
     def execute(self, query, params=None):
-        # Convertir la requête de type PostgreSQL/MySQL en SQLite
-        query = query.replace('%s', '?')
-        query = query.replace('RETURNING id', '')
+        statement = translate_query(query)
         
         if params is None:
-            self.cursor.execute(query)
+            self.cursor.execute(statement.sql)
         else:
-            self.cursor.execute(query, params)
+            self.cursor.execute(statement.sql, params)
+        
+        self.returned = None
+        if statement.returning:
+            self.returned = statement.returned_rows(self.cursor)
         
         return self
     
+    def executemany(self, query, seq_of_params):
+        """Exécute la requête pour chaque jeu de paramètres, en une seule instruction préparée"""
+        statement = translate_query(query)
+        if statement.returning:
+            raise ValueError("RETURNING n'est pas supporté par executemany")
+        self.cursor.executemany(statement.sql, seq_of_params)
+        self.returned = None
+        return self
+    
     def fetchone(self):
-        row = self.cursor.fetchone()
-        if row is None:
-            return None
-        return {
-            description[0]: row[i]
-            for i, description in enumerate(self.cursor.description)
-        }
+        if self.returned is not None:
+            return self.returned.pop(0) if self.returned else None
+        return self.cursor.fetchone()
+    
+    def fetchmany(self, size=100):
+        if self.returned is not None:
+            rows, self.returned = self.returned[:size], self.returned[size:]
+            return rows
+        return self.cursor.fetchmany(size)
     
     def fetchall(self):
-        rows = self.cursor.fetchall()
-        result = []
-        for row in rows:
-            result.append({
-                description[0]: row[i]
-                for i, description in enumerate(self.cursor.description)
-            })
-        return result
+        if self.returned is not None:
+            rows, self.returned = self.returned, []
+            return rows
+        return self.cursor.fetchall()
+    
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
     
     def close(self):
         return self.cursor.close()
@@ -177,26 +215,158 @@ class Cursor:
         return self.cursor.rowcount
     
     def __iter__(self):
-        self.rows = self.fetchall()
-        self.index = 0
-        return self
-    
-    def __next__(self):
-        if self.rows is None or self.index >= len(self.rows):
-            raise StopIteration
-        row = self.rows[self.index]
-        self.index += 1
-        return row
+        # Parcours en flux : les lignes sont lues au fur et à mesure,
+        # sans construire de liste intermédiaire
+        if self.returned is not None:
+            rows, self.returned = self.returned, []
+            return iter(rows)
+        return iter(self.cursor)
+
+_ALLOWED_PRAGMAS = {'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout'}
+
+def apply_pragmas(conn, pragmas):
+    """Applique un profil de pragmas à une connexion sqlite3 brute"""
+    for name, value in pragmas.items():
+        if name not in _ALLOWED_PRAGMAS:
+            raise ValueError(f"Pragma SQLite non supporté: {name}")
+        if not re.fullmatch(r'-?\w+', str(value)):
+            raise ValueError(f"Valeur invalide pour le pragma {name}: {value}")
+        conn.execute(f"PRAGMA {name} = {value}")
+
+class ConnectionPool:
+    """Pool de connexions SQLite partagé par tout le processus.
+
+    Chaque get_connection() reçoit sa propre connexion, déjà configurée : un
+    appel imbriqué (un modèle qui en appelle un autre) n'hérite donc jamais
+    de la transaction de l'appelant, et son commit() ou rollback() ne touche
+    que son propre travail. Une fois rendue, la connexion retourne dans la
+    liste des connexions inactives et sera réutilisée par le prochain
+    appelant, quel que soit son thread (les reruns Streamlit s'exécutent
+    chacun dans un nouveau thread).
+    """
+
+    def __init__(self, db_path, max_idle=DB_POOL_SIZE, pragmas=None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        self._lock = threading.Lock()
+        self._idle = []
+        self._in_use = set()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.discarded = 0
+
+    def _connect(self):
+        # Créer le répertoire parent si nécessaire
+        Path(os.path.dirname(self.db_path)).mkdir(parents=True, exist_ok=True)
+
+        # La connexion peut passer d'un thread à l'autre, mais jamais en même temps
+        busy_timeout = self.pragmas.get('busy_timeout', 5000)
+        conn = sqlite3.connect(self.db_path, timeout=busy_timeout / 1000, check_same_thread=False)
+        conn.row_factory = Row
+        apply_pragmas(conn, self.pragmas)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def acquire(self):
+        """Retourne une connexion inactive du pool, ou en crée une"""
+        conn = None
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                self.hits += 1
+            else:
+                self.misses += 1
+        if conn is None:
+            conn = self._connect()
+
+        with self._lock:
+            self._in_use.add(id(conn))
+        return conn
+
+    def release(self, conn):
+        """Rend la connexion au pool, depuis n'importe quel thread"""
+        with self._lock:
+            if id(conn) not in self._in_use:
+                # Connexion inconnue ou déjà rendue : on ne la remet pas en circulation
+                return
+            self._in_use.discard(id(conn))
+
+        try:
+            # Comme un close(), les modifications non validées sont abandonnées
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self.discarded += 1
+        conn.close()
+
+    def close_all(self):
+        """Ferme toutes les connexions inactives"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'created': self.created,
+                'discarded': self.discarded,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Retourne le pool du processus (recréé si DB_PATH a changé)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+def pool_stats():
+    """Compteurs hits/misses du pool, pour suivre le renouvellement des connexions"""
+    return get_pool().stats()
+
+# Compteurs de génération par table : chaque écriture qui modifie une table
+# de référence incrémente son compteur, ce qui invalide les caches construits
+# à partir d'une génération antérieure.
+_generations = {}
+_generations_lock = threading.Lock()
+
+def bump_generation(*tables):
+    """Signale une modification des tables données"""
+    with _generations_lock:
+        for table in tables:
+            _generations[table] = _generations.get(table, 0) + 1
+
+def generation(*tables):
+    """Génération courante des tables données (tuple comparable)"""
+    with _generations_lock:
+        return tuple(_generations.get(table, 0) for table in tables)
 
 def get_connection():
+    pool = get_pool()
     try:
-        # Créer le répertoire parent si nécessaire
-        Path(os.path.dirname(DB_PATH)).mkdir(parents=True, exist_ok=True)
-        
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        return Connection(conn)
+        return Connection(pool.acquire(), pool)
     except Exception as e:
         error_msg = (
             f"Impossible de se connecter à la base de données SQLite: {str(e)}\n"
@@ -205,307 +375,695 @@ def get_connection():
         logging.error(error_msg)
         raise RuntimeError(error_msg) from e
 
-def init_db():
+@contextmanager
+def immediate_transaction():
+    """Curseur dans une transaction d'écriture réservée dès son ouverture (BEGIN IMMEDIATE).
+
+    Le verrou d'écriture est pris avant la première lecture : les contrôles
+    faits dans la transaction restent valables jusqu'au commit, et un
+    écrivain concurrent attend (busy_timeout) au lieu d'échouer au moment de
+    valider. Les écritures liées doivent passer par le curseur fourni : une
+    autre connexion ouverte pendant la transaction attendrait le verrou.
+    """
     conn = get_connection()
     cur = conn.cursor()
     try:
-        # Permissions table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS permissions (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        cur.execute("BEGIN IMMEDIATE")
+        yield cur
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
 
-        # Users table with additional fields
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                name TEXT NOT NULL,
-                status TEXT NOT NULL CHECK (status IN ('parent', 'cadet', 'AMC', 'animateur', 'administration')),
-                first_name TEXT,
-                rank TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+# Index de recherche plein texte (FTS5), synchronisés par triggers avec
+# leur table source : table FTS5 -> (table source, {colonne indexée: colonne source}).
+# 'rank' est un nom de colonne réservé par FTS5 : le grade est indexé sous le
+# nom 'grade', lu à travers la vue <table FTS5>_content qui sert de contenu externe.
+SEARCH_INDEXES = {
+    'users_fts': ('users', {'name': 'name', 'first_name': 'first_name', 'email': 'email', 'grade': 'rank'}),
+    'inventory_fts': ('inventory', {'item_name': 'item_name', 'category': 'category'}),
+}
 
-        # Parent-Child relationship table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS parent_child (
-                parent_id INTEGER,
-                child_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (parent_id, child_id),
-                FOREIGN KEY (parent_id) REFERENCES users(id),
-                FOREIGN KEY (child_id) REFERENCES users(id),
-                CHECK (parent_id != child_id)
-            )
-        """)
+def _column_exists(cur, table, column):
+    cur.execute(f"PRAGMA table_info({table})")
+    return any(row['name'] == column for row in cur.fetchall())
 
-        # Roles table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+def init_search_indexes(cur):
+    """Crée les tables FTS5, leurs vues de contenu et leurs triggers, puis les remplit à la création"""
+    # Les modèles d'inventaire utilisent une catégorie texte
+    if not _column_exists(cur, 'inventory', 'category'):
+        cur.execute("ALTER TABLE inventory ADD COLUMN category TEXT")
 
-        # Role permissions mapping
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS role_permissions (
-                role_id INTEGER,
-                permission_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (role_id, permission_id),
-                FOREIGN KEY (role_id) REFERENCES roles(id),
-                FOREIGN KEY (permission_id) REFERENCES permissions(id)
-            )
-        """)
+    for fts_table, (table, columns) in SEARCH_INDEXES.items():
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+        exists = cur.fetchone() is not None
 
-        # User roles mapping
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_roles (
-                user_id INTEGER,
-                role_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (user_id, role_id),
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (role_id) REFERENCES roles(id)
-            )
+        column_list = ', '.join(columns)
+        source_list = ', '.join(columns.values())
+        new_values = ', '.join(f'new.{source}' for source in columns.values())
+        old_values = ', '.join(f'old.{source}' for source in columns.values())
+        cur.execute(f"""
+            CREATE VIEW IF NOT EXISTS {fts_table}_content AS
+            SELECT id, {', '.join(f'{source} AS {column}' for column, source in columns.items())}
+            FROM {table}
         """)
-
-        # Activities table with QR codes
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS activities (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT,
-                date DATE NOT NULL,
-                start_time TIME NOT NULL,
-                end_time TIME NOT NULL,
-                max_participants INTEGER NOT NULL,
-                entry_qr_code TEXT NOT NULL,
-                exit_qr_code TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        cur.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                {column_list},
+                content='{fts_table}_content', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
             )
         """)
-
-        # Inventory categories table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS inventory_categories (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+            END
         """)
-        
-        # Inventory table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS inventory (
-                id INTEGER PRIMARY KEY,
-                item_name TEXT NOT NULL,
-                category_id INTEGER,
-                quantity INTEGER NOT NULL DEFAULT 0,
-                unit TEXT NOT NULL,
-                min_quantity INTEGER NOT NULL DEFAULT 0,
-                photo_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (category_id) REFERENCES inventory_categories(id)
-            )
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list})
+                VALUES ('delete', old.id, {old_values});
+            END
         """)
-        
-        # Add default inventory category if none exists
-        cur.execute("SELECT COUNT(*) as count FROM inventory_categories")
-        result = cur.fetchone()
-        if result and result['count'] == 0:
-            cur.execute("""
-                INSERT INTO inventory_categories (name, description)
-                VALUES (?, ?)
-            """, ('Général', 'Catégorie par défaut pour tous les articles'))
-        
-        # Attendance records
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY,
-                activity_id INTEGER,
-                user_id INTEGER,
-                check_in_time TIMESTAMP,
-                qr_code_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (activity_id, user_id),
-                FOREIGN KEY (activity_id) REFERENCES activities(id),
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {source_list} ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list})
+                VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.id, {new_values});
+            END
         """)
+        if not exists:
+            cur.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
 
-        # Activity equipment table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS activity_equipment (
-                id INTEGER PRIMARY KEY,
-                activity_id INTEGER,
-                inventory_id INTEGER,
-                quantity_required INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (activity_id, inventory_id),
-                FOREIGN KEY (activity_id) REFERENCES activities(id),
-                FOREIGN KEY (inventory_id) REFERENCES inventory(id),
-                CHECK (quantity_required > 0)
-            )
-        """)
+def fts_query(text):
+    """Transforme une saisie libre en requête FTS5 : chaque mot en préfixe, tous requis"""
+    terms = re.findall(r'\w+', text or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
 
-        # Evaluation types table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS evaluation_types (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL UNIQUE,
-                min_rating INTEGER NOT NULL DEFAULT 1,
-                max_rating INTEGER NOT NULL DEFAULT 5,
-                description TEXT,
-                active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                CHECK (min_rating <= max_rating)
-            )
-        """)
+# Migrations du schéma, appliquées dans l'ordre et enregistrées dans la
+# table schema_version : une base existante ne rejoue que les migrations
+# qui lui manquent. Chaque migration doit rester idempotente (IF NOT EXISTS)
+# car les bases antérieures au suivi des versions repartent de la version 0.
 
-        # User notes table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_notes (
-                id INTEGER PRIMARY KEY,
-                user_id INTEGER,
-                evaluator_id INTEGER,
-                note_date DATE NOT NULL,
-                note_type TEXT NOT NULL,
-                rating INTEGER CHECK (rating BETWEEN 1 AND 5),
-                appreciation TEXT,
-                evaluation_type_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id),
-                FOREIGN KEY (evaluator_id) REFERENCES users(id),
-                FOREIGN KEY (evaluation_type_id) REFERENCES evaluation_types(id)
-            )
+def _migration_base_schema(cur):
+    """Tables historiques de l'application"""
+    # Permissions table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS permissions (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Users table with additional fields
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            name TEXT NOT NULL,
+            status TEXT NOT NULL CHECK (status IN ('parent', 'cadet', 'AMC', 'animateur', 'administration')),
+            first_name TEXT,
+            rank TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Parent-Child relationship table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS parent_child (
+            parent_id INTEGER,
+            child_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (parent_id, child_id),
+            FOREIGN KEY (parent_id) REFERENCES users(id),
+            FOREIGN KEY (child_id) REFERENCES users(id),
+            CHECK (parent_id != child_id)
+        )
+    """)
+
+    # Roles table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Role permissions mapping
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS role_permissions (
+            role_id INTEGER,
+            permission_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (role_id, permission_id),
+            FOREIGN KEY (role_id) REFERENCES roles(id),
+            FOREIGN KEY (permission_id) REFERENCES permissions(id)
+        )
+    """)
+
+    # User roles mapping
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_roles (
+            user_id INTEGER,
+            role_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, role_id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (role_id) REFERENCES roles(id)
+        )
+    """)
+
+    # Activities table with QR codes
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS activities (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            max_participants INTEGER NOT NULL,
+            entry_qr_code TEXT NOT NULL,
+            exit_qr_code TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Inventory categories table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Inventory table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS inventory (
+            id INTEGER PRIMARY KEY,
+            item_name TEXT NOT NULL,
+            category_id INTEGER,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            unit TEXT NOT NULL,
+            min_quantity INTEGER NOT NULL DEFAULT 0,
+            photo_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES inventory_categories(id)
+        )
+    """)
+
+    # Attendance records
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY,
+            activity_id INTEGER,
+            user_id INTEGER,
+            check_in_time TIMESTAMP,
+            qr_code_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (activity_id, user_id),
+            FOREIGN KEY (activity_id) REFERENCES activities(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Activity equipment table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS activity_equipment (
+            id INTEGER PRIMARY KEY,
+            activity_id INTEGER,
+            inventory_id INTEGER,
+            quantity_required INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (activity_id, inventory_id),
+            FOREIGN KEY (activity_id) REFERENCES activities(id),
+            FOREIGN KEY (inventory_id) REFERENCES inventory(id),
+            CHECK (quantity_required > 0)
+        )
+    """)
+
+    # Evaluation types table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS evaluation_types (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            min_rating INTEGER NOT NULL DEFAULT 1,
+            max_rating INTEGER NOT NULL DEFAULT 5,
+            description TEXT,
+            active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CHECK (min_rating <= max_rating)
+        )
+    """)
+
+    # User notes table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_notes (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            evaluator_id INTEGER,
+            note_date DATE NOT NULL,
+            note_type TEXT NOT NULL,
+            rating INTEGER CHECK (rating BETWEEN 1 AND 5),
+            appreciation TEXT,
+            evaluation_type_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (evaluator_id) REFERENCES users(id),
+            FOREIGN KEY (evaluation_type_id) REFERENCES evaluation_types(id)
+        )
+    """)
+
+def _migration_model_tables(cur):
+    """Tables et colonnes utilisées par les modèles mais absentes du schéma initial"""
+    for column, definition in (('location', 'TEXT'),
+                               ('lunch_included', 'BOOLEAN DEFAULT 0'),
+                               ('dinner_included', 'BOOLEAN DEFAULT 0')):
+        if not _column_exists(cur, 'activities', column):
+            cur.execute(f"ALTER TABLE activities ADD COLUMN {column} {definition}")
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS activity_attendance (
+            activity_id INTEGER,
+            user_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (activity_id, user_id),
+            FOREIGN KEY (activity_id) REFERENCES activities(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS equipment_assignments (
+            id INTEGER PRIMARY KEY,
+            inventory_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            returned_at TIMESTAMP,
+            FOREIGN KEY (inventory_id) REFERENCES inventory(id),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            CHECK (quantity > 0)
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS equipment_requests (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            equipment_id INTEGER NOT NULL,
+            request_type TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            reason TEXT,
+            status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'approved', 'rejected')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed_at TIMESTAMP,
+            processed_by INTEGER,
+            rejection_reason TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (equipment_id) REFERENCES inventory(id),
+            FOREIGN KEY (processed_by) REFERENCES users(id),
+            CHECK (quantity > 0)
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS badges (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            icon_name TEXT,
+            points_required INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS category_fields (
+            id INTEGER PRIMARY KEY,
+            category_id INTEGER NOT NULL,
+            field_name TEXT NOT NULL,
+            field_type TEXT NOT NULL,
+            required BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES inventory_categories(id)
+        )
+    """)
+
+def _migration_photo_store(cur):
+    """Déplace les photos binaires encore stockées dans inventory vers le stockage de fichiers"""
+    cur.execute("SELECT id, photo_url FROM inventory WHERE typeof(photo_url) = 'blob'")
+    legacy_photos = cur.fetchall()
+    if legacy_photos:
+        from utils.blob_store import photo_store
+        for row in legacy_photos:
+            cur.execute("UPDATE inventory SET photo_url = ? WHERE id = ?",
+                        (photo_store.put(row['photo_url']), row['id']))
+
+# Index secondaires des chemins d'accès fréquents des modèles
+SCHEMA_INDEXES = {
+    'idx_equipment_assignments_user': 'equipment_assignments (user_id, returned_at, assigned_at)',
+    'idx_equipment_assignments_inventory': 'equipment_assignments (inventory_id)',
+    'idx_equipment_requests_status': 'equipment_requests (status, created_at)',
+    'idx_attendance_user': 'attendance (user_id)',
+    'idx_user_notes_user_date': 'user_notes (user_id, note_date)',
+    'idx_parent_child_child': 'parent_child (child_id)',
+    'idx_user_roles_role': 'user_roles (role_id)',
+    'idx_users_name': 'users (name, id)',
+    'idx_users_status_name': 'users (status, name)',
+    'idx_inventory_category_id': 'inventory (category_id)',
+    'idx_inventory_listing': "inventory (COALESCE(category, ''), item_name, id)",
+    'idx_category_fields_category': 'category_fields (category_id, field_name)',
+}
+
+def _migration_secondary_indexes(cur):
+    """Index des filtres et tris utilisés par les modèles"""
+    for name, target in SCHEMA_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    # Statistiques pour que le planificateur choisisse les nouveaux index
+    cur.execute("ANALYZE")
+
+# Données de référence insérées à la création de la base
+DEFAULT_EVALUATION_TYPES = [
+    ('Comportement', 1, 5, 'Évaluation du comportement général'),
+    ('Participation', 1, 5, 'Niveau de participation aux activités'),
+    ('Leadership', 1, 5, 'Capacités de leadership'),
+    ('Technique', 1, 5, 'Compétences techniques'),
+    ('Esprit d\'équipe', 1, 5, 'Capacité à travailler en équipe')
+]
+
+DEFAULT_PERMISSIONS = [
+    ('manage_users', 'Gérer les utilisateurs'),
+    ('manage_roles', 'Gérer les rôles et permissions'),
+    ('manage_inventory', 'Gérer les stocks'),
+    ('manage_activities', 'Gérer les activités'),
+    ('view_reports', 'Voir les rapports'),
+    ('manage_communications', 'Gérer les communications'),
+    ('manage_attendance', 'Gérer les présences'),
+    ('scan_qr_codes', 'Scanner les QR codes de présence'),
+    ('view_child_attendance', 'Voir les présences des enfants'),
+    ('view_child_equipment', 'Voir les équipements des enfants'),
+    ('view_child_progression', 'Voir la progression des enfants'),
+    ('view_activities', 'Voir les activités')
+]
+
+DEFAULT_ROLES = [
+    ('admin', 'Administrateur système', ['manage_users', 'manage_roles', 'manage_inventory', 'manage_activities', 'view_reports', 'manage_communications', 'manage_attendance']),
+    ('animateur', 'Animateur standard', ['manage_activities', 'view_reports', 'manage_attendance']),
+    ('parent', 'Parent', ['view_child_attendance', 'view_child_equipment', 'view_child_progression', 'view_activities', 'manage_communications']),
+    ('cadet', 'Cadet', ['scan_qr_codes', 'view_activities']),
+    ('AMC', 'Aide-Moniteur Cadet', ['scan_qr_codes', 'view_activities'])
+]
+
+def _migration_default_data(cur):
+    """Catégorie, types d'évaluation, permissions, rôles et compte administrateur par défaut"""
+    # Add default inventory category if none exists
+    cur.execute("""
+        INSERT INTO inventory_categories (name, description)
+        SELECT ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM inventory_categories)
+    """, ('Général', 'Catégorie par défaut pour tous les articles'))
+
+    # Insert default evaluation types if none exist
+    cur.execute("SELECT COUNT(*) as count FROM evaluation_types")
+    if cur.fetchone()['count'] == 0:
+        cur.executemany("""
+            INSERT OR IGNORE INTO evaluation_types
+            (name, min_rating, max_rating, description)
+            VALUES (?, ?, ?, ?)
+        """, DEFAULT_EVALUATION_TYPES)
+
+    cur.executemany("""
+        INSERT OR IGNORE INTO permissions (name, description)
+        VALUES (?, ?)
+    """, DEFAULT_PERMISSIONS)
+
+    cur.executemany("""
+        INSERT OR IGNORE INTO roles (name, description)
+        VALUES (?, ?)
+    """, [(role_name, description) for role_name, description, _ in DEFAULT_ROLES])
+
+    # Les identifiants sont résolus par jointure : une seule instruction par lien
+    cur.executemany("""
+        INSERT OR IGNORE INTO role_permissions (role_id, permission_id)
+        SELECT r.id, p.id
+        FROM roles r, permissions p
+        WHERE r.name = ? AND p.name = ?
+    """, [(role_name, perm) for role_name, _, permissions in DEFAULT_ROLES for perm in permissions])
+
+    # Create default admin user if it doesn't exist
+    import hashlib
+    password_hash = hashlib.sha256('admin123'.encode()).hexdigest()
+    cur.execute("""
+        INSERT OR IGNORE INTO users (email, password_hash, name, status)
+        VALUES (?, ?, ?, ?)
+    """, ('admin@admin.com', password_hash, 'Administrateur', 'administration'))
+    cur.execute("""
+        INSERT OR IGNORE INTO user_roles (user_id, role_id)
+        SELECT u.id, r.id
+        FROM users u, roles r
+        WHERE u.email = 'admin@admin.com' AND r.name = 'admin'
+    """)
+
+def _migration_user_stats(cur):
+    """Points matérialisés par utilisateur, tenus à jour par triggers, et vue de classement"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            note_points INTEGER NOT NULL DEFAULT 0,
+            attendance_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # Notes : une note de 1 à 5 rapporte 2 à 10 points
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_notes_ai AFTER INSERT ON user_notes BEGIN
+            INSERT INTO user_stats (user_id, note_points) VALUES (new.user_id, COALESCE(new.rating, 0) * 2)
+            ON CONFLICT (user_id) DO UPDATE SET note_points = note_points + excluded.note_points;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_notes_ad AFTER DELETE ON user_notes BEGIN
+            UPDATE user_stats SET note_points = note_points - COALESCE(old.rating, 0) * 2
+            WHERE user_id = old.user_id;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_notes_au AFTER UPDATE OF user_id, rating ON user_notes BEGIN
+            UPDATE user_stats SET note_points = note_points - COALESCE(old.rating, 0) * 2
+            WHERE user_id = old.user_id;
+            INSERT INTO user_stats (user_id, note_points) VALUES (new.user_id, COALESCE(new.rating, 0) * 2)
+            ON CONFLICT (user_id) DO UPDATE SET note_points = note_points + excluded.note_points;
+        END
+    """)
+
+    # Présences : 10 points chacune
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_attendance_ai AFTER INSERT ON attendance BEGIN
+            INSERT INTO user_stats (user_id, attendance_count) VALUES (new.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET attendance_count = attendance_count + 1;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_attendance_ad AFTER DELETE ON attendance BEGIN
+            UPDATE user_stats SET attendance_count = attendance_count - 1
+            WHERE user_id = old.user_id;
+        END
+    """)
+
+    # Reprise des données existantes
+    cur.execute("DELETE FROM user_stats")
+    cur.execute("""
+        INSERT INTO user_stats (user_id, note_points, attendance_count)
+        SELECT user_id, SUM(note_points), SUM(attendance_count)
+        FROM (
+            SELECT user_id, COALESCE(SUM(rating * 2), 0) AS note_points, 0 AS attendance_count
+            FROM user_notes WHERE user_id IS NOT NULL GROUP BY user_id
+            UNION ALL
+            SELECT user_id, 0, COUNT(*)
+            FROM attendance WHERE user_id IS NOT NULL GROUP BY user_id
+        )
+        GROUP BY user_id
+    """)
+
+    cur.execute("""
+        CREATE VIEW IF NOT EXISTS leaderboard AS
+        SELECT u.id AS user_id, u.name, u.first_name, u.status,
+               COALESCE(s.note_points, 0) + COALESCE(s.attendance_count, 0) * 10 AS points
+        FROM users u
+        LEFT JOIN user_stats s ON s.user_id = u.id
+    """)
+
+def _migration_jobs(cur):
+    """File de travaux en arrière-plan (rapports, documents)"""
+    # AUTOINCREMENT : un identifiant suivi par une session n'est jamais réattribué après purge
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            dedup_key TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+            result_path TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            expires_at TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (dedup_key, status)")
+
+def _migration_outbox(cur):
+    """File d'envoi des emails, vidée par un expéditeur en arrière-plan"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            html_body TEXT NOT NULL,
+            attachments TEXT,
+            status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'sending', 'sent', 'failed')),
+            claim TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_claim ON outbox (claim)")
+
+def _migration_stock_movements(cur):
+    """Journal des mouvements de stock, en ajout seul"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            inventory_id INTEGER NOT NULL,
+            movement_type TEXT NOT NULL
+                CHECK (movement_type IN ('initial', 'assign', 'return', 'adjust', 'request_approval')),
+            quantity INTEGER NOT NULL,
+            balance_after INTEGER NOT NULL,
+            user_id INTEGER,
+            assignment_id INTEGER,
+            request_id INTEGER,
+            performed_by INTEGER,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (inventory_id) REFERENCES inventory(id),
+            FOREIGN KEY (assignment_id) REFERENCES equipment_assignments(id),
+            FOREIGN KEY (request_id) REFERENCES equipment_requests(id)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_item ON stock_movements (inventory_id, id)")
+    for operation in ('UPDATE', 'DELETE'):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS stock_movements_no_{operation.lower()}
+            BEFORE {operation} ON stock_movements BEGIN
+                SELECT RAISE(ABORT, 'Le journal des mouvements de stock est en ajout seul');
+            END
         """)
 
-        # Insert default evaluation types if none exist
-        cur.execute("SELECT COUNT(*) as count FROM evaluation_types")
-        result = cur.fetchone()
-        if result and result['count'] == 0:
-            default_types = [
-                ('Comportement', 1, 5, 'Évaluation du comportement général'),
-                ('Participation', 1, 5, 'Niveau de participation aux activités'),
-                ('Leadership', 1, 5, 'Capacités de leadership'),
-                ('Technique', 1, 5, 'Compétences techniques'),
-                ('Esprit d\'équipe', 1, 5, 'Capacité à travailler en équipe')
-            ]
-            for name, min_rating, max_rating, description in default_types:
-                cur.execute("""
-                    INSERT INTO evaluation_types 
-                    (name, min_rating, max_rating, description)
-                    VALUES (?, ?, ?, ?)
-                """, (name, min_rating, max_rating, description))
-
-        # Insert default permissions
-        default_permissions = [
-            ('manage_users', 'Gérer les utilisateurs'),
-            ('manage_roles', 'Gérer les rôles et permissions'),
-            ('manage_inventory', 'Gérer les stocks'),
-            ('manage_activities', 'Gérer les activités'),
-            ('view_reports', 'Voir les rapports'),
-            ('manage_communications', 'Gérer les communications'),
-            ('manage_attendance', 'Gérer les présences'),
-            ('scan_qr_codes', 'Scanner les QR codes de présence'),
-            ('view_child_attendance', 'Voir les présences des enfants'),
-            ('view_child_equipment', 'Voir les équipements des enfants'),
-            ('view_child_progression', 'Voir la progression des enfants'),
-            ('view_activities', 'Voir les activités')
-        ]
-
-        for perm_name, description in default_permissions:
-            # Use OR IGNORE for SQLite instead of INSERT IGNORE
-            cur.execute("""
-                INSERT OR IGNORE INTO permissions (name, description)
-                VALUES (?, ?)
-            """, (perm_name, description))
-
-        # Insert default roles with their permissions
-        default_roles = [
-            ('admin', 'Administrateur système', ['manage_users', 'manage_roles', 'manage_inventory', 'manage_activities', 'view_reports', 'manage_communications', 'manage_attendance']),
-            ('animateur', 'Animateur standard', ['manage_activities', 'view_reports', 'manage_attendance']),
-            ('parent', 'Parent', ['view_child_attendance', 'view_child_equipment', 'view_child_progression', 'view_activities', 'manage_communications']),
-            ('cadet', 'Cadet', ['scan_qr_codes', 'view_activities']),
-            ('AMC', 'Aide-Moniteur Cadet', ['scan_qr_codes', 'view_activities'])
-        ]
-
-        for role_name, description, permissions in default_roles:
-            # Insérer le rôle s'il n'existe pas déjà
-            cur.execute("SELECT id FROM roles WHERE name = ?", (role_name,))
-            role_result = cur.fetchone()
-            
-            if not role_result:
-                cur.execute("""
-                    INSERT INTO roles (name, description)
-                    VALUES (?, ?)
-                """, (role_name, description))
-                
-                # En SQLite, utiliser sqlite_last_insert_rowid() ou juste SELECT last_insert_rowid()
-                cur.execute("SELECT last_insert_rowid() as id")
-                role_result = cur.fetchone()
-            
-            if role_result:
-                role_id = role_result['id']
-                
-                # Ajouter les permissions
-                for perm in permissions:
-                    cur.execute("SELECT id FROM permissions WHERE name = ?", (perm,))
-                    perm_result = cur.fetchone()
-                    if perm_result:
-                        try:
-                            cur.execute("""
-                                INSERT OR IGNORE INTO role_permissions (role_id, permission_id)
-                                VALUES (?, ?)
-                            """, (role_id, perm_result['id']))
-                        except Exception as e:
-                            logging.warning(f"Erreur lors de l'ajout de la permission {perm} au rôle {role_name}: {str(e)}")
-
-        # Create default admin user if it doesn't exist
-        cur.execute("SELECT * FROM users WHERE email = 'admin@admin.com'")
-        admin_exists = cur.fetchone()
-
-        if not admin_exists:
-            import hashlib
-            password_hash = hashlib.sha256('admin123'.encode()).hexdigest()
-            cur.execute("""
-                INSERT INTO users (email, password_hash, name, status)
-                VALUES (?, ?, ?, ?)
-            """, ('admin@admin.com', password_hash, 'Administrateur', 'administration'))
-            
-            # Get the last inserted id
-            cur.execute("SELECT last_insert_rowid() as id")
-            admin_id_row = cur.fetchone()
-            if admin_id_row:
-                admin_id = admin_id_row['id']
-
-                # Assign admin role
-                cur.execute("SELECT id FROM roles WHERE name = 'admin'")
-                admin_role = cur.fetchone()
-                if admin_role:
-                    try:
-                        cur.execute("""
-                            INSERT OR IGNORE INTO user_roles (user_id, role_id)
-                            VALUES (?, ?)
-                        """, (admin_id, admin_role['id']))
-                    except Exception as e:
-                        logging.warning(f"Erreur lors de l'ajout du rôle admin à l'utilisateur admin: {str(e)}")
+    # Solde d'ouverture : la somme des mouvements d'un article égale son stock
+    cur.execute("""
+        INSERT INTO stock_movements (inventory_id, movement_type, quantity, balance_after, reason)
+        SELECT id, 'initial', quantity, quantity, 'Reprise du stock existant'
+        FROM inventory
+        WHERE id NOT IN (SELECT inventory_id FROM stock_movements)
+    """)
+
+def _migration_search_content_views(cur):
+    """Index de recherche reconstruits sur leurs vues de contenu (grade des utilisateurs inclus)"""
+    for fts_table in SEARCH_INDEXES:
+        for suffix in ('ai', 'ad', 'au'):
+            cur.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+        cur.execute(f"DROP TABLE IF EXISTS {fts_table}")
+        cur.execute(f"DROP VIEW IF EXISTS {fts_table}_content")
+    init_search_indexes(cur)
+
+def _migration_inventory_archive(cur):
+    """Articles archivés au lieu d'être supprimés : le journal des stocks garde ses références"""
+    if not _column_exists(cur, 'inventory', 'archived_at'):
+        cur.execute("ALTER TABLE inventory ADD COLUMN archived_at TIMESTAMP")
+
+MIGRATIONS = [
+    (1, "Tables de base", _migration_base_schema),
+    (2, "Tables des modèles d'équipement, badges et présences", _migration_model_tables),
+    (3, "Photos d'inventaire dans le stockage de fichiers", _migration_photo_store),
+    (4, "Index de recherche plein texte", init_search_indexes),
+    (5, "Index secondaires", _migration_secondary_indexes),
+    (6, "Données par défaut", _migration_default_data),
+    (7, "Statistiques de points et classement", _migration_user_stats),
+    (8, "File de travaux en arrière-plan", _migration_jobs),
+    (9, "File d'envoi des emails", _migration_outbox),
+    (10, "Journal des mouvements de stock", _migration_stock_movements),
+    (11, "Grade des utilisateurs dans l'index de recherche", _migration_search_content_views),
+    (12, "Archivage des articles d'inventaire", _migration_inventory_archive),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(cur):
+    """Applique les migrations manquantes et retourne la version du schéma"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+    current = cur.fetchone()['version']
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        logging.info(f"Migration du schéma vers la version {version} : {description}")
+        apply(cur)
+        cur.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description))
+        current = version
+    return current
 
+# Base déjà initialisée par ce processus : les réexécutions du script
+# Streamlit n'ouvrent alors aucune connexion
+_initialized_db = None
+_init_lock = threading.Lock()
+
+def init_db():
+    """Crée ou met à jour le schéma, une seule fois par processus et par base"""
+    global _initialized_db
+    if _initialized_db == DB_PATH:
+        return
+    with _init_lock:
+        if _initialized_db == DB_PATH:
+            return
+        _init_db()
+        _initialized_db = DB_PATH
+
+def _init_db():
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        version = migrate(cur)
         conn.commit()
-        logging.info("Base de données SQLite initialisée avec succès!")
+        logging.info(f"Base de données SQLite initialisée avec succès (schéma v{version})")
 
     except (RuntimeError, ValueError) as e:
         # Ces erreurs ont déjà des messages détaillés
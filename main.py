@@ -1,6 +1,8 @@
 import streamlit as st
 import database
 from models import User
+from utils.jobs import job_queue
+from utils.outbox import mail_sender
 import hashlib
 from pathlib import Path
 import base64
@@ -30,6 +32,12 @@ try:
     database.init_db()
     logger.info("Database initialized successfully")
 
+    # Répartiteur des travaux et expéditeur des e-mails en arrière-plan (une
+    # seule fois par processus) : reprennent ce qu'un processus précédent a
+    # laissé en file
+    job_queue.start()
+    mail_sender.start()
+
     # Charger le CSS personnalisé
     def load_css():
         try:
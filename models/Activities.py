@@ -2,6 +2,7 @@ from datetime import datetime, time
 from typing import Optional, List
 
 import database
+from models.Summary import Summary
 
 class Activity:
     def __init__(self, id: int, name: str, description: str, date: datetime, start_time: time,
@@ -36,6 +37,7 @@ class Activity:
             """, (name, description, date, start_time, end_time,
                   max_participants, location, lunch_included, dinner_included))
             conn.commit()
+            database.bump_generation('activities')
             if (data := cur.fetchone()) is not None:
                 return Activity(*data)
             return None
@@ -54,7 +56,41 @@ class Activity:
                 FROM activities
                 ORDER BY date DESC, start_time ASC
             """)
-            return [Activity(*row) for row in cur.fetchall()]
+            return [Activity(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_summaries() -> List[Summary]:
+        """Liste légère (id, "nom - date") pour les sélecteurs, sans la description"""
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, name || ' - ' || date
+                FROM activities
+                ORDER BY date DESC, start_time ASC
+            """)
+            return [Summary(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_by_id(activity_id: int) -> Optional['Activity']:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, name, description, date, start_time, end_time,
+                       max_participants, location, lunch_included, dinner_included
+                FROM activities
+                WHERE id = %s
+            """, (activity_id,))
+            if (data := cur.fetchone()) is not None:
+                return Activity(*data)
+            return None
         finally:
             cur.close()
             conn.close()
@@ -75,6 +111,7 @@ class Activity:
             """, (name, description, date, start_time, end_time,
                   max_participants, location, lunch_included, dinner_included, self.id))
             conn.commit()
+            database.bump_generation('activities')
             success = cur.fetchone() is not None
             if success:
                 self.name = name
@@ -98,6 +135,7 @@ class Activity:
         try:
             cur.execute("DELETE FROM activities WHERE id = %s RETURNING id", (activity_id,))
             conn.commit()
+            database.bump_generation('activities')
             return cur.fetchone() is not None
         except Exception as e:
             conn.rollback()
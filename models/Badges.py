@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 import database
+from utils.cache import cached_read_model
 
 
 class Badge:
@@ -12,6 +13,7 @@ class Badge:
         self.points_required = points_required
 
     @staticmethod
+    @cached_read_model('badges')
     def get_all() -> List['Badge']:
         conn = database.get_connection()
         cur = conn.cursor()
@@ -37,6 +39,7 @@ class Badge:
                 RETURNING id, name, description, icon_name, points_required
             """, (name, description, icon_name, points_required))
             conn.commit()
+            database.bump_generation('badges')
             if (data := cur.fetchone()) is not None:
                 return Badge(*data)
             return None
@@ -21,6 +21,7 @@ class CategoryField:
                 RETURNING id, category_id, field_name, field_type, required
             """, (category_id, field_name, field_type, required))
             conn.commit()
+            database.bump_generation('category_fields')
             if (data := cur.fetchone()) is not None:
                 return CategoryField(*data)
             return None
@@ -55,6 +56,7 @@ class CategoryField:
                 RETURNING id
             """, (field_name, field_type, required, self.id))
             conn.commit()
+            database.bump_generation('category_fields')
             success = cur.fetchone() is not None
             if success:
                 self.field_name = field_name
@@ -72,6 +74,7 @@ class CategoryField:
         try:
             cur.execute("DELETE FROM category_fields WHERE id = %s RETURNING id", (field_id,))
             conn.commit()
+            database.bump_generation('category_fields')
             return cur.fetchone() is not None
         except Exception as e:
             conn.rollback()
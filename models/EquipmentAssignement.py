@@ -1,7 +1,10 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Tuple
 
 import database
+from models.Inventory import Inventory
+from models.StockMovement import StockMovement
+from models.User import User
 
 
 class EquipmentAssignment:
@@ -10,42 +13,102 @@ class EquipmentAssignment:
         self.inventory_id = inventory_id
         self.user_id = user_id
         self.quantity = quantity
-        self.assigned_at = assigned_at
+        # SQLite renvoie les horodatages sous forme de texte ISO
+        self.assigned_at = datetime.fromisoformat(assigned_at) if isinstance(assigned_at, str) else assigned_at
 
     @staticmethod
-    def assign_to_user(inventory_id: int, user_id: int, quantity: int) -> bool:
-        conn = database.get_connection()
-        cur = conn.cursor()
-        try:
-            # Vérifier si l'équipement est disponible en quantité suffisante
-            cur.execute("SELECT quantity FROM inventory WHERE id = %s", (inventory_id,))
-            current_stock = cur.fetchone()
-            if not current_stock or current_stock[0] < quantity:
-                raise ValueError("Stock insuffisant")
+    def _assign(cur, inventory_id: int, user_id: int, quantity: int, movement_type: str = 'assign',
+                request_id: int = None, performed_by: int = None) -> int:
+        """Crée l'affectation et sort le stock correspondant, dans la transaction de cur"""
+        cur.execute("""
+            INSERT INTO equipment_assignments (inventory_id, user_id, quantity, assigned_at)
+            VALUES (%s, %s, %s, NOW())
+            RETURNING id
+        """, (inventory_id, user_id, quantity))
+        assignment_id = cur.fetchone()[0]
+        StockMovement.apply(cur, inventory_id, -quantity, movement_type, user_id=user_id,
+                            assignment_id=assignment_id, request_id=request_id, performed_by=performed_by)
+        return assignment_id
 
-            # Créer l'assignation
-            cur.execute("""
+    @staticmethod
+    def assign_to_user(inventory_id: int, user_id: int, quantity: int, performed_by: int = None) -> bool:
+        # Le stock n'est décrémenté que s'il couvre la quantité (ValueError sinon)
+        with database.immediate_transaction() as cur:
+            EquipmentAssignment._assign(cur, inventory_id, user_id, quantity, performed_by=performed_by)
+        database.bump_generation('inventory')
+        return True
+
+    @staticmethod
+    def bulk_assign(user_ids: List[int], items: List[Tuple[int, int]],
+                    performed_by: int = None) -> Dict[int, Dict[int, int]]:
+        """Affecte le même lot d'équipements à plusieurs utilisateurs, en une seule transaction.
+
+        items est une liste de paires (inventory_id, quantité par utilisateur).
+        La disponibilité est vérifiée une fois pour tout le lot, les affectations
+        sont insérées par executemany et le stock de chaque article est décrémenté
+        par un seul mouvement. Si un article ne couvre pas la distribution,
+        ValueError et rien n'est affecté.
+
+        Retourne la matrice {user_id: {inventory_id: assignment_id}}.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        per_user = {}
+        for inventory_id, quantity in items:
+            if quantity <= 0:
+                raise ValueError("La quantité doit être positive")
+            per_user[inventory_id] = per_user.get(inventory_id, 0) + quantity
+        if not user_ids or not per_user:
+            return {}
+
+        with database.immediate_transaction() as cur:
+            cur.execute(f"""
+                SELECT id FROM users WHERE id IN ({', '.join(['%s'] * len(user_ids))})
+            """, user_ids)
+            known = {row[0] for row in cur.fetchall()}
+            unknown = [str(user_id) for user_id in user_ids if user_id not in known]
+            if unknown:
+                raise ValueError(f"Utilisateur(s) introuvable(s): {', '.join(unknown)}")
+
+            cur.execute(f"""
+                SELECT id, item_name, quantity
+                FROM inventory
+                WHERE archived_at IS NULL AND id IN ({', '.join(['%s'] * len(per_user))})
+            """, list(per_user))
+            stock = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+            missing = [str(inventory_id) for inventory_id in per_user if inventory_id not in stock]
+            if missing:
+                raise ValueError(f"Article(s) introuvable(s): {', '.join(missing)}")
+            short = [
+                f"{stock[inventory_id][0]} ({quantity * len(user_ids)} demandés, {stock[inventory_id][1]} disponibles)"
+                for inventory_id, quantity in per_user.items()
+                if quantity * len(user_ids) > stock[inventory_id][1]
+            ]
+            if short:
+                raise ValueError(f"Stock insuffisant: {', '.join(short)}")
+
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM equipment_assignments")
+            last_id = cur.fetchone()[0]
+            cur.executemany("""
                 INSERT INTO equipment_assignments (inventory_id, user_id, quantity, assigned_at)
                 VALUES (%s, %s, %s, NOW())
-                RETURNING id, inventory_id, user_id, quantity, assigned_at
-            """, (inventory_id, user_id, quantity))
-
-            # Mettre à jour le stock
-            new_quantity = current_stock[0] - quantity
+            """, [(inventory_id, user_id, quantity)
+                  for user_id in user_ids for inventory_id, quantity in per_user.items()])
             cur.execute("""
-                UPDATE inventory
-                SET quantity = %s
-                WHERE id = %s
-            """, (new_quantity, inventory_id))
+                SELECT id, user_id, inventory_id FROM equipment_assignments WHERE id > %s ORDER BY id
+            """, (last_id,))
+            matrix = {user_id: {} for user_id in user_ids}
+            for assignment_id, user_id, inventory_id in cur.fetchall():
+                matrix[user_id][inventory_id] = assignment_id
 
-            conn.commit()
-            return True
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cur.close()
-            conn.close()
+            # Une sortie de stock par article pour toute la distribution
+            for inventory_id, quantity in per_user.items():
+                StockMovement.apply(cur, inventory_id, -quantity * len(user_ids), 'assign',
+                                    performed_by=performed_by,
+                                    reason=f"Distribution groupée: {len(user_ids)} utilisateur(s)")
+
+        database.bump_generation('inventory')
+        return matrix
 
     @staticmethod
     def get_user_assignments(user_id: int) -> List['EquipmentAssignment']:
@@ -63,34 +126,77 @@ class EquipmentAssignment:
             cur.close()
             conn.close()
 
-    def return_equipment(self) -> bool:
+    @staticmethod
+    def get_for_parent(parent_id: int) -> List[dict]:
+        """Équipements en cours d'affectation aux enfants d'un parent, en une seule requête.
+
+        Retourne une liste d'articles, chacun sous la forme
+        {'item': Inventory, 'quantity': total affecté,
+         'children': [{'child': User, 'assignments': [EquipmentAssignment, ...]}, ...]}
+        """
         conn = database.get_connection()
         cur = conn.cursor()
         try:
-            # Marquer l'équipement comme retourné
             cur.execute("""
-                UPDATE equipment_assignments
-                SET returned_at = NOW()
-                WHERE id = %s AND returned_at IS NULL
-                RETURNING id
-            """, (self.id,))
+                SELECT i.id, i.item_name, i.category, i.quantity, i.unit, i.min_quantity,
+                       u.id, u.name, u.email, u.password_hash, u.status, u.first_name, u.rank,
+                       ea.id, ea.quantity, ea.assigned_at
+                FROM parent_child pc
+                JOIN users u ON u.id = pc.child_id
+                JOIN equipment_assignments ea ON ea.user_id = u.id AND ea.returned_at IS NULL
+                JOIN inventory i ON i.id = ea.inventory_id
+                WHERE pc.parent_id = %s
+                ORDER BY i.category, i.item_name, u.name, ea.assigned_at DESC
+            """, (parent_id,))
 
-            if cur.fetchone() is None:
-                return False
+            grouped = {}
+            children = {}
+            for row in cur:
+                item_id, child_id = row[0], row[6]
+                entry = grouped.get(item_id)
+                if entry is None:
+                    entry = grouped[item_id] = {
+                        'item': Inventory(*row[0:6]),
+                        'quantity': 0,
+                        'children': {}
+                    }
+                if child_id not in children:
+                    children[child_id] = User(*row[6:13])
+                child_entry = entry['children'].get(child_id)
+                if child_entry is None:
+                    child_entry = entry['children'][child_id] = {
+                        'child': children[child_id],
+                        'assignments': []
+                    }
+                child_entry['assignments'].append(
+                    EquipmentAssignment(row[13], item_id, child_id, row[14], row[15])
+                )
+                entry['quantity'] += row[14]
 
-            # Remettre la quantité en stock
-            cur.execute("""
-                UPDATE inventory
-                SET quantity = quantity + %s
-                WHERE id = %s
-            """, (self.quantity, self.inventory_id))
+            for entry in grouped.values():
+                entry['children'] = list(entry['children'].values())
+            return list(grouped.values())
+        finally:
+            cur.close()
+            conn.close()
+
+    def return_equipment(self, performed_by: int = None) -> bool:
+        try:
+            with database.immediate_transaction() as cur:
+                # Marquer l'équipement comme retourné (une seule fois)
+                cur.execute("""
+                    UPDATE equipment_assignments
+                    SET returned_at = NOW()
+                    WHERE id = %s AND returned_at IS NULL
+                """, (self.id,))
+                if cur.rowcount != 1:
+                    return False
 
-            conn.commit()
-            return True
+                # Remettre la quantité en stock
+                StockMovement.apply(cur, self.inventory_id, self.quantity, 'return', user_id=self.user_id,
+                                    assignment_id=self.id, performed_by=performed_by)
         except Exception as e:
-            conn.rollback()
             print(f"Error returning equipment: {str(e)}")
             return False
-        finally:
-            cur.close()
-            conn.close()
+        database.bump_generation('inventory')
+        return True
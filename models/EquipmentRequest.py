@@ -1,8 +1,11 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, List, Optional, Tuple
 
 import database
 from models.EquipmentAssignement import EquipmentAssignment
+from models.Inventory import Inventory
+from models.StockMovement import StockMovement
+from models.User import User
 
 
 class EquipmentRequest:
@@ -16,93 +19,215 @@ class EquipmentRequest:
         self.quantity = quantity
         self.reason = reason
         self.status = status
-        self.created_at = created_at
-        self.processed_at = processed_at
+        # SQLite renvoie les horodatages sous forme de texte ISO
+        self.created_at = datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
+        self.processed_at = datetime.fromisoformat(processed_at) if isinstance(processed_at, str) else processed_at
         self.processed_by = processed_by
         self.rejection_reason = rejection_reason
 
-
-@staticmethod
-def create(user_id: int, equipment_id: int, request_type: str, quantity: int,
-           reason: str, status: str = 'pending') -> Optional['EquipmentRequest']:
-    conn = database.get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
+    @staticmethod
+    def create(user_id: int, equipment_id: int, request_type: str, quantity: int,
+               reason: str, status: str = 'pending') -> Optional['EquipmentRequest']:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
                 INSERT INTO equipment_requests 
                 (user_id, equipment_id, request_type, quantity, reason, status, created_at)
                 VALUES (%s, %s, %s, %s, %s, %s, NOW())
                 RETURNING id, user_id, equipment_id, request_type, quantity, reason, status, created_at,
                           processed_at, processed_by, rejection_reason
             """, (user_id, equipment_id, request_type, quantity, reason, status))
-        conn.commit()
-        if (data := cur.fetchone()) is not None:
-            return EquipmentRequest(*data)
-        return None
-    finally:
-        cur.close()
-        conn.close()
-
-
-@staticmethod
-def get_pending_requests() -> List['EquipmentRequest']:
-    conn = database.get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
+            conn.commit()
+            if (data := cur.fetchone()) is not None:
+                return EquipmentRequest(*data)
+            return None
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_pending_requests() -> List['EquipmentRequest']:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
                 SELECT id, user_id, equipment_id, request_type, quantity, reason,
                        status, created_at, processed_at, processed_by, rejection_reason
                 FROM equipment_requests
                 WHERE status = 'pending'
                 ORDER BY created_at DESC
             """)
-        return [EquipmentRequest(*row) for row in cur.fetchall()]
-    finally:
-        cur.close()
-        conn.close()
-
+            return [EquipmentRequest(*row) for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
 
-def approve(self) -> tuple[bool, str]:
-    try:
-        # Assigner l'équipement à l'utilisateur
-        EquipmentAssignment.assign_to_user(self.equipment_id, self.user_id, self.quantity)
+    @staticmethod
+    def get_pending_details() -> List[dict]:
+        """Demandes en attente avec leur demandeur et leur article, en une seule requête.
 
-        # Mettre à jour le statut de la demande
+        Retourne une liste de {'request': EquipmentRequest, 'user': User, 'item': Inventory},
+        de la plus ancienne à la plus récente.
+        """
         conn = database.get_connection()
         cur = conn.cursor()
         try:
             cur.execute("""
+                SELECT r.id, r.user_id, r.equipment_id, r.request_type, r.quantity, r.reason,
+                       r.status, r.created_at, r.processed_at, r.processed_by, r.rejection_reason,
+                       u.id, u.name, u.email, u.password_hash, u.status, u.first_name, u.rank,
+                       i.id, i.item_name, i.category, i.quantity, i.unit, i.min_quantity
+                FROM equipment_requests r
+                JOIN users u ON u.id = r.user_id
+                JOIN inventory i ON i.id = r.equipment_id
+                WHERE r.status = 'pending'
+                ORDER BY r.created_at, r.id
+            """)
+            return [{
+                'request': EquipmentRequest(*row[0:11]),
+                'user': User(*row[11:18]),
+                'item': Inventory(*row[18:24])
+            } for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def approve_many(request_ids: List[int], processed_by: int = None) -> Tuple[List[int], List[str]]:
+        """Approuve un ensemble de demandes en une seule transaction.
+
+        Les demandes sont servies de la plus ancienne à la plus récente tant que
+        le stock de leur article le permet ; les autres restent en attente et
+        sont signalées dans les erreurs. Les affectations sont insérées par
+        executemany ; le stock de chaque article est décrémenté une seule fois,
+        avec une ligne du journal par demande (request_id et assignment_id)
+        comme approve(). Retourne (ids approuvés, erreurs).
+        """
+        if not request_ids:
+            return [], []
+
+        errors = []
+        with database.immediate_transaction() as cur:
+            cur.execute(f"""
+                SELECT r.id, r.user_id, r.equipment_id, r.quantity, i.item_name, i.quantity
+                FROM equipment_requests r
+                JOIN inventory i ON i.id = r.equipment_id
+                WHERE r.status = 'pending' AND r.id IN ({', '.join(['%s'] * len(request_ids))})
+                ORDER BY r.created_at, r.id
+            """, list(request_ids))
+            rows = cur.fetchall()
+
+            found = {row[0] for row in rows}
+            errors.extend(f"Demande {request_id} déjà traitée ou introuvable"
+                          for request_id in request_ids if request_id not in found)
+
+            remaining = {}
+            approved = []
+            for request_id, user_id, inventory_id, quantity, item_name, stock in rows:
+                available = remaining.setdefault(inventory_id, stock)
+                if quantity > available:
+                    errors.append(f"Demande {request_id}: stock insuffisant pour {item_name} "
+                                  f"({quantity} demandés, {available} restants)")
+                    continue
+                remaining[inventory_id] = available - quantity
+                approved.append((request_id, user_id, inventory_id, quantity))
+
+            if approved:
+                cur.executemany("""
                     UPDATE equipment_requests
-                    SET status = 'approved', processed_at = NOW()
-                    WHERE id = %s
-                    RETURNING id
-                """, (self.id,))
+                    SET status = 'approved', processed_at = NOW(), processed_by = %s
+                    WHERE id = %s AND status = 'pending'
+                """, [(processed_by, request_id) for request_id, _, _, _ in approved])
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM equipment_assignments")
+                last_id = cur.fetchone()[0]
+                cur.executemany("""
+                    INSERT INTO equipment_assignments (inventory_id, user_id, quantity, assigned_at)
+                    VALUES (%s, %s, %s, NOW())
+                """, [(inventory_id, user_id, quantity) for _, user_id, inventory_id, quantity in approved])
+                cur.execute("SELECT id FROM equipment_assignments WHERE id > %s ORDER BY id", (last_id,))
+                assignment_ids = [row[0] for row in cur.fetchall()]
+
+                # Une ligne du journal par demande, rattachée à son affectation
+                movements: Dict[int, List[dict]] = {}
+                for (request_id, user_id, inventory_id, quantity), assignment_id in zip(approved, assignment_ids):
+                    movements.setdefault(inventory_id, []).append({
+                        'quantity': -quantity,
+                        'user_id': user_id,
+                        'assignment_id': assignment_id,
+                        'request_id': request_id
+                    })
+                for inventory_id, item_movements in movements.items():
+                    StockMovement.apply_many(cur, inventory_id, 'request_approval', item_movements,
+                                             performed_by=processed_by)
+
+        if approved:
+            database.bump_generation('inventory')
+        return [request_id for request_id, _, _, _ in approved], errors
+
+    @staticmethod
+    def reject_many(request_ids: List[int], reason: str, processed_by: int = None) -> int:
+        """Rejette en une seule requête les demandes encore en attente ; retourne leur nombre"""
+        if not request_ids:
+            return 0
+
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                UPDATE equipment_requests
+                SET status = 'rejected', processed_at = NOW(), processed_by = %s, rejection_reason = %s
+                WHERE status = 'pending' AND id IN ({', '.join(['%s'] * len(request_ids))})
+            """, [processed_by, reason, *request_ids])
             conn.commit()
-            return True, "Demande approuvée et équipement assigné avec succès"
+            return cur.rowcount
+        except Exception:
+            conn.rollback()
+            raise
         finally:
             cur.close()
             conn.close()
-    except ValueError as e:
-        return False, str(e)
-    except Exception as e:
-        return False, f"Erreur lors de l'approbation: {str(e)}"
 
+    def approve(self, processed_by: int = None) -> tuple[bool, str]:
+        try:
+            # Statut, affectation et sortie de stock dans une seule transaction d'écriture
+            with database.immediate_transaction() as cur:
+                cur.execute("""
+                    UPDATE equipment_requests
+                    SET status = 'approved', processed_at = NOW(), processed_by = %s
+                    WHERE id = %s AND status = 'pending'
+                """, (processed_by, self.id))
+                if cur.rowcount != 1:
+                    return False, "Cette demande a déjà été traitée"
+
+                EquipmentAssignment._assign(cur, self.equipment_id, self.user_id, self.quantity,
+                                            movement_type='request_approval', request_id=self.id,
+                                            performed_by=processed_by)
+            database.bump_generation('inventory')
+            self.status = 'approved'
+            return True, "Demande approuvée et équipement assigné avec succès"
+        except ValueError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Erreur lors de l'approbation: {str(e)}"
 
-def reject(self, reason: str) -> tuple[bool, str]:
-    conn = database.get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
+    def reject(self, reason: str, processed_by: int = None) -> tuple[bool, str]:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
                 UPDATE equipment_requests
-                SET status = 'rejected', processed_at = NOW(), rejection_reason = %s
-                WHERE id = %s
-                RETURNING id
-            """, (reason, self.id))
-        conn.commit()
-        return True, "Demande rejetée avec succès"
-    except Exception as e:
-        conn.rollback()
-        return False, f"Erreur lors du rejet: {str(e)}"
-    finally:
-        cur.close()
-        conn.close()
+                SET status = 'rejected', processed_at = NOW(), processed_by = %s, rejection_reason = %s
+                WHERE id = %s AND status = 'pending'
+            """, (processed_by, reason, self.id))
+            conn.commit()
+            if cur.rowcount != 1:
+                return False, "Cette demande a déjà été traitée"
+            self.status = 'rejected'
+            return True, "Demande rejetée avec succès"
+        except Exception as e:
+            conn.rollback()
+            return False, f"Erreur lors du rejet: {str(e)}"
+        finally:
+            cur.close()
+            conn.close()
@@ -1,6 +1,7 @@
 from typing import Optional, List
 
 import database
+from utils.cache import cached_read_model
 
 
 class EvaluationType:
@@ -28,6 +29,7 @@ class EvaluationType:
                 RETURNING id, name, min_rating, max_rating, description, active
             """, (name, min_rating, max_rating, description, active))
             conn.commit()
+            database.bump_generation('evaluation_types')
             if (data := cur.fetchone()) is not None:
                 return EvaluationType(*data)
             return None
@@ -36,6 +38,7 @@ class EvaluationType:
             conn.close()
 
     @staticmethod
+    @cached_read_model('evaluation_types')
     def get_all(active_only: bool = True) -> List['EvaluationType']:
         conn = database.get_connection()
         cur = conn.cursor()
@@ -96,6 +99,7 @@ class EvaluationType:
         try:
             cur.execute(query, values)
             conn.commit()
+            database.bump_generation('evaluation_types')
             success = cur.fetchone() is not None
             if success:
                 if name is not None:
@@ -1,6 +1,10 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 import database
+from models.StockMovement import StockMovement
+from models.Summary import Summary
+from utils.blob_store import photo_store
+from utils.cache import cached_read_model
 
 
 class Inventory:
@@ -15,31 +19,45 @@ class Inventory:
         self.photo_url = photo_url
 
     @staticmethod
-    def update_quantity(item_id: int, new_quantity: int) -> bool:
-        """Update the quantity of an inventory item."""
+    def _store_photo(photo_data):
+        """Les images binaires vont dans le stockage de fichiers, la table ne garde que la référence"""
+        if isinstance(photo_data, (bytes, bytearray, memoryview)):
+            return photo_store.put(bytes(photo_data))
+        return photo_data
+
+    @staticmethod
+    def update_quantity(item_id: int, new_quantity: int, performed_by: int = None,
+                        reason: str = None) -> bool:
+        """Fixe le stock d'un article (inventaire physique) ; l'écart est journalisé"""
         if new_quantity < 0:
             return False
 
-        conn = database.get_connection()
-        cur = conn.cursor()
         try:
-            cur.execute("""
-                UPDATE inventory 
-                SET quantity = %s 
-                WHERE id = %s
-                RETURNING id
-            """, (new_quantity, item_id))
-
-            result = cur.fetchone() is not None
-            conn.commit()
-            return result
+            with database.immediate_transaction() as cur:
+                cur.execute("SELECT quantity FROM inventory WHERE id = %s", (item_id,))
+                if (row := cur.fetchone()) is None:
+                    return False
+                if new_quantity != row[0]:
+                    StockMovement.apply(cur, item_id, new_quantity - row[0], 'adjust',
+                                        performed_by=performed_by, reason=reason)
         except Exception as e:
-            conn.rollback()
             print(f"Error updating quantity: {str(e)}")
             return False
-        finally:
-            cur.close()
-            conn.close()
+        database.bump_generation('inventory')
+        return True
+
+    @staticmethod
+    def adjust_quantity(item_id: int, delta: int, performed_by: int = None, reason: str = None) -> int:
+        """Entrée (delta > 0) ou sortie (delta < 0) de stock ; retourne le nouveau solde.
+
+        Lève ValueError si la sortie dépasse le stock disponible au moment de
+        l'écriture, quel que soit le stock affiché à l'utilisateur.
+        """
+        with database.immediate_transaction() as cur:
+            balance = StockMovement.apply(cur, item_id, delta, 'adjust',
+                                          performed_by=performed_by, reason=reason)
+        database.bump_generation('inventory')
+        return balance
 
     @staticmethod
     def update_photo_url(item_id: int, photo_data) -> bool:
@@ -47,9 +65,10 @@ class Inventory:
         Met à jour la photo d'un article d'inventaire.
         photo_data peut être:
         - une URL (str)
-        - des données binaires d'image (bytes)
+        - des données binaires d'image (bytes), enregistrées dans le stockage de fichiers
         - None pour supprimer la photo
         """
+        photo_data = Inventory._store_photo(photo_data)
         conn = database.get_connection()
         cur = conn.cursor()
         try:
@@ -62,6 +81,7 @@ class Inventory:
 
             result = cur.fetchone() is not None
             conn.commit()
+            database.bump_generation('inventory')
             return result
         except Exception as e:
             conn.rollback()
@@ -85,33 +105,134 @@ class Inventory:
         Crée un nouvel article dans l'inventaire
         photo_data peut être soit une URL (str) soit des données binaires d'image (bytes)
         """
+        photo_data = Inventory._store_photo(photo_data)
+        with database.immediate_transaction() as cur:
+            # Article créé à 0 puis approvisionné : le journal contient le stock initial
+            cur.execute("""
+                INSERT INTO inventory (item_name, category, quantity, unit, min_quantity, photo_url)
+                VALUES (%s, %s, 0, %s, %s, %s)
+                RETURNING id
+            """, (item_name, category, unit, min_quantity, photo_data))
+            item_id = cur.fetchone()[0]
+            StockMovement.apply(cur, item_id, quantity, 'initial')
+        database.bump_generation('inventory')
+        return Inventory.get_by_id(item_id)
+
+    @staticmethod
+    def get_all() -> List['Inventory']:
         conn = database.get_connection()
         cur = conn.cursor()
         try:
             cur.execute("""
-                INSERT INTO inventory (item_name, category, quantity, unit, min_quantity, photo_url)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id, item_name, category, quantity, unit, min_quantity, photo_url
-            """, (item_name, category, quantity, unit, min_quantity, photo_data))
-            conn.commit()
-            if (data := cur.fetchone()) is not None:
-                return Inventory(*data)
-            return None
+                SELECT id, item_name, category, quantity, unit, min_quantity, photo_url
+                FROM inventory
+                WHERE archived_at IS NULL
+                ORDER BY category, item_name
+            """)
+            return [Inventory(*row) for row in cur]
         finally:
             cur.close()
             conn.close()
 
     @staticmethod
-    def get_all() -> List['Inventory']:
+    def search(text: str, limit: int = 20) -> List[Summary]:
+        """Recherche plein texte (article, catégorie) par préfixe, résultats classés"""
+        if (match := database.fts_query(text)) is None:
+            return []
+
         conn = database.get_connection()
         cur = conn.cursor()
         try:
             cur.execute("""
-                SELECT id, item_name, category, quantity, unit, min_quantity, photo_url
+                SELECT i.id, i.item_name || ' (' || COALESCE(i.category, '') || ')'
+                FROM inventory_fts
+                JOIN inventory i ON i.id = inventory_fts.rowid
+                WHERE inventory_fts MATCH %s AND i.archived_at IS NULL
+                ORDER BY inventory_fts.rank
+                LIMIT %s
+            """, (match, limit))
+            return [Summary(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def _page_query(after: Tuple[str, str, int] = None, limit: int = 25, search: str = None,
+                    category: str = None) -> Tuple[str, list]:
+        """Requête et paramètres d'une page de page() (aussi contrôlée par check_query_plans.py)"""
+        query = """
+            SELECT id, item_name, category, quantity, unit, min_quantity, photo_url
+            FROM inventory
+            WHERE archived_at IS NULL
+        """
+        params = []
+        if after is not None:
+            query += " AND (COALESCE(category, ''), item_name, id) > (%s, %s, %s)"
+            params.extend(after)
+        if (match := database.fts_query(search)) is not None:
+            query += " AND id IN (SELECT rowid FROM inventory_fts WHERE inventory_fts MATCH %s)"
+            params.append(match)
+        if category:
+            query += " AND category = %s"
+            params.append(category)
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        query += " ORDER BY COALESCE(category, ''), item_name, id LIMIT %s"
+        params.append(limit + 1)
+        return query, params
+
+    @staticmethod
+    def page(after: Tuple[str, str, int] = None, limit: int = 25, search: str = None,
+             category: str = None) -> Tuple[List['Inventory'], Optional[Tuple[str, str, int]]]:
+        """Page d'articles triée par catégorie puis nom, par pagination à curseur (keyset).
+
+        after est le curseur (catégorie, nom, id) du dernier article de la page
+        précédente. Retourne la page et le curseur suivant (None s'il n'y en a pas).
+        """
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(*Inventory._page_query(after, limit, search, category))
+            items = [Inventory(*row) for row in cur]
+            if len(items) > limit:
+                items = items[:limit]
+                last = items[-1]
+                return items, (last.category or '', last.item_name, last.id)
+            return items, None
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    @cached_read_model('inventory')
+    def get_summaries() -> List[Summary]:
+        """Liste légère (id, "article (catégorie)") pour les sélecteurs"""
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, item_name || ' (' || COALESCE(category, '') || ')'
                 FROM inventory
+                WHERE archived_at IS NULL
                 ORDER BY category, item_name
             """)
-            return [Inventory(*row) for row in cur.fetchall()]
+            return [Summary(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_by_id(item_id: int) -> Optional['Inventory']:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, item_name, category, quantity, unit, min_quantity, photo_url
+                FROM inventory
+                WHERE id = %s
+            """, (item_id,))
+            if (data := cur.fetchone()) is not None:
+                return Inventory(*data)
+            return None
         finally:
             cur.close()
             conn.close()
@@ -130,19 +251,32 @@ class Inventory:
                 WHERE pc.parent_id = %s AND ea.returned_at IS NULL
                 ORDER BY i.category, i.item_name
             """, (parent_id,))
-            return [Inventory(*row) for row in cur.fetchall()]
+            return [Inventory(*row) for row in cur]
         finally:
             cur.close()
             conn.close()
 
     @staticmethod
     def delete(item_id: int) -> bool:
+        """Archive l'article : il disparaît des listes mais reste référencé par le journal des stocks.
+
+        Refusé tant qu'une quantité de l'article est encore affectée.
+        """
         conn = database.get_connection()
         cur = conn.cursor()
         try:
-            cur.execute("DELETE FROM inventory WHERE id = %s RETURNING id", (item_id,))
+            cur.execute("""
+                UPDATE inventory
+                SET archived_at = NOW(), updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND archived_at IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM equipment_assignments
+                    WHERE inventory_id = inventory.id AND returned_at IS NULL
+                )
+            """, (item_id,))
             conn.commit()
-            return cur.fetchone() is not None
+            database.bump_generation('inventory')
+            return cur.rowcount == 1
         except Exception as e:
             conn.rollback()
             print(f"Error deleting item: {str(e)}")
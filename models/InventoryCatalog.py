@@ -0,0 +1,52 @@
+from typing import Dict, List, Optional
+
+from models.Inventory import Inventory
+from utils.cache import load_copy
+
+
+class InventoryCatalog:
+    """Vue indexée de l'inventaire : recherche par id, par catégorie et stock bas en O(1).
+
+    Le catalogue est construit une fois dans le cache des modèles de lecture
+    et rechargé quand la génération de la table inventory change (création,
+    modification, suppression, mouvement de stock) ; chaque appel à current()
+    en reçoit une copie, les sessions ne partagent donc aucun objet.
+    """
+
+    def __init__(self, items: List[Inventory]):
+        self.items = items
+        self.by_id: Dict[int, Inventory] = {item.id: item for item in items}
+        self.by_category: Dict[str, List[Inventory]] = {}
+        self.low_stock: List[Inventory] = []
+        for item in items:
+            self.by_category.setdefault(item.category, []).append(item)
+            if item.quantity <= item.min_quantity:
+                self.low_stock.append(item)
+
+    @staticmethod
+    def current() -> 'InventoryCatalog':
+        """Catalogue à jour, rechargé seulement après une écriture sur l'inventaire"""
+        return load_copy(
+            'inventory_catalog', ('inventory',),
+            lambda: InventoryCatalog(Inventory.get_all())
+        )
+
+    def get(self, item_id: int) -> Optional[Inventory]:
+        return self.by_id.get(item_id)
+
+    def in_category(self, category: str) -> List[Inventory]:
+        return self.by_category.get(category, [])
+
+    def available(self) -> List[Inventory]:
+        """Articles ayant encore du stock"""
+        return [item for item in self.items if item.quantity > 0]
+
+    def is_low_stock(self, item_id: int) -> bool:
+        item = self.by_id.get(item_id)
+        return item is not None and item.quantity <= item.min_quantity
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
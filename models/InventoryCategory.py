@@ -1,6 +1,7 @@
 from typing import Optional, List
 
 import database
+from utils.cache import cached_read_model
 from models.CategoryField import CategoryField
 
 
@@ -22,6 +23,7 @@ class InventoryCategory:
                 RETURNING id, name, description
             """, (name, description))
             conn.commit()
+            database.bump_generation('inventory_categories')
             if (data := cur.fetchone()) is not None:
                 category = InventoryCategory(*data)
                 category.fields = CategoryField.get_for_category(category.id)
@@ -32,6 +34,7 @@ class InventoryCategory:
             conn.close()
 
     @staticmethod
+    @cached_read_model('inventory_categories', 'category_fields')
     def get_all() -> List['InventoryCategory']:
         conn = database.get_connection()
         cur = conn.cursor()
@@ -60,6 +63,7 @@ class InventoryCategory:
                 RETURNING id
             """, (new_name, new_description, self.id))
             conn.commit()
+            database.bump_generation('inventory_categories')
             success = cur.fetchone() is not None
             if success:
                 self.name = new_name
@@ -76,6 +80,7 @@ class InventoryCategory:
         try:
             cur.execute("DELETE FROM inventory_categories WHERE id = %s RETURNING id", (category_id,))
             conn.commit()
+            database.bump_generation('inventory_categories')
             return cur.fetchone() is not None
         except Exception as e:
             conn.rollback()
@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 import database
+from utils.cache import cached_read_model
 
 
 class Permission:
@@ -10,6 +11,7 @@ class Permission:
         self.description = description
 
     @staticmethod
+    @cached_read_model('permissions')
     def get_all() -> List['Permission']:
         conn = database.get_connection()
         cur = conn.cursor()
@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 import database
+from utils.cache import cached_read_model
 
 
 class Role:
@@ -10,6 +11,7 @@ class Role:
         self.description = description
 
     @staticmethod
+    @cached_read_model('roles')
     def get_all() -> List['Role']:
         conn = database.get_connection()
         cur = conn.cursor()
@@ -60,6 +62,7 @@ class Role:
                 """, (self.id, perm_name))
 
             conn.commit()
+            database.bump_generation('role_permissions')
             return True
         except Exception as e:
             conn.rollback()
@@ -80,6 +83,7 @@ class Role:
                 RETURNING id, name, description
             """, (name, description))
             conn.commit()
+            database.bump_generation('roles')
             if (data := cur.fetchone()) is not None:
                 return Role(*data)
             return None
@@ -108,6 +112,7 @@ class Role:
         try:
             cur.execute("DELETE FROM roles WHERE id = %s RETURNING id", (self.id,))
             conn.commit()
+            database.bump_generation('roles')
             return cur.fetchone() is not None
         finally:
             cur.close()
@@ -141,6 +146,7 @@ class Role:
                 RETURNING role_id
             """, (self.id, permission_id))
             conn.commit()
+            database.bump_generation('role_permissions')
             return cur.fetchone() is not None
         finally:
             cur.close()
@@ -156,6 +162,7 @@ class Role:
                 RETURNING role_id
             """, (self.id, permission_id))
             conn.commit()
+            database.bump_generation('role_permissions')
             return cur.fetchone() is not None
         finally:
             cur.close()
@@ -0,0 +1,135 @@
+from datetime import datetime
+from typing import List, Optional
+
+import database
+
+MOVEMENT_TYPES = ('initial', 'assign', 'return', 'adjust', 'request_approval')
+
+
+class StockMovement:
+    def __init__(self, id: int, inventory_id: int, movement_type: str, quantity: int, balance_after: int,
+                 user_id: Optional[int], assignment_id: Optional[int], request_id: Optional[int],
+                 performed_by: Optional[int], reason: Optional[str], created_at: datetime):
+        self.id = id
+        self.inventory_id = inventory_id
+        self.movement_type = movement_type
+        self.quantity = quantity
+        self.balance_after = balance_after
+        self.user_id = user_id
+        self.assignment_id = assignment_id
+        self.request_id = request_id
+        self.performed_by = performed_by
+        self.reason = reason
+        self.created_at = created_at
+
+    @staticmethod
+    def apply(cur, inventory_id: int, quantity: int, movement_type: str, user_id: int = None,
+              assignment_id: int = None, request_id: int = None, performed_by: int = None,
+              reason: str = None) -> int:
+        """Applique un mouvement signé au stock et l'inscrit au journal ; retourne le nouveau solde.
+
+        À appeler dans database.immediate_transaction() : la sortie n'a lieu
+        que si le stock la couvre (UPDATE conditionnel), sinon ValueError et
+        l'appelant annule toute la transaction.
+        """
+        if movement_type not in MOVEMENT_TYPES:
+            raise ValueError(f"Type de mouvement inconnu: {movement_type}")
+
+        cur.execute("""
+            UPDATE inventory
+            SET quantity = quantity + %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND quantity >= %s
+        """, (quantity, inventory_id, max(0, -quantity)))
+        if cur.rowcount != 1:
+            raise ValueError("Stock insuffisant")
+
+        cur.execute("""
+            INSERT INTO stock_movements (inventory_id, movement_type, quantity, balance_after, user_id,
+                                         assignment_id, request_id, performed_by, reason)
+            SELECT id, %s, %s, quantity, %s, %s, %s, %s, %s
+            FROM inventory
+            WHERE id = %s
+        """, (movement_type, quantity, user_id, assignment_id, request_id, performed_by, reason, inventory_id))
+        cur.execute("SELECT quantity FROM inventory WHERE id = %s", (inventory_id,))
+        return cur.fetchone()[0]
+
+    @staticmethod
+    def apply_many(cur, inventory_id: int, movement_type: str, movements: List[dict],
+                   performed_by: int = None) -> int:
+        """Applique plusieurs mouvements d'un même article, un par ligne du journal ; retourne le solde.
+
+        movements est une liste de dicts (quantity, user_id, assignment_id,
+        request_id, reason), les clés absentes valant None. Le stock n'est
+        modifié qu'une fois, par un UPDATE conditionnel sur le total ; les
+        lignes du journal sont insérées par executemany avec leur solde
+        successif. Même contrat transactionnel que apply().
+        """
+        if movement_type not in MOVEMENT_TYPES:
+            raise ValueError(f"Type de mouvement inconnu: {movement_type}")
+        total = sum(movement['quantity'] for movement in movements)
+
+        cur.execute("""
+            UPDATE inventory
+            SET quantity = quantity + %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND quantity >= %s
+        """, (total, inventory_id, max(0, -total)))
+        if cur.rowcount != 1:
+            raise ValueError("Stock insuffisant")
+        cur.execute("SELECT quantity FROM inventory WHERE id = %s", (inventory_id,))
+        balance = cur.fetchone()[0]
+
+        rows = []
+        running = balance - total
+        for movement in movements:
+            running += movement['quantity']
+            rows.append((inventory_id, movement_type, movement['quantity'], running,
+                         movement.get('user_id'), movement.get('assignment_id'),
+                         movement.get('request_id'), performed_by, movement.get('reason')))
+        cur.executemany("""
+            INSERT INTO stock_movements (inventory_id, movement_type, quantity, balance_after, user_id,
+                                         assignment_id, request_id, performed_by, reason)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        return balance
+
+    @staticmethod
+    def get_for_item(inventory_id: int, limit: int = 50) -> List['StockMovement']:
+        """Derniers mouvements d'un article, du plus récent au plus ancien"""
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, inventory_id, movement_type, quantity, balance_after, user_id,
+                       assignment_id, request_id, performed_by, reason, created_at
+                FROM stock_movements
+                WHERE inventory_id = %s
+                ORDER BY id DESC
+                LIMIT %s
+            """, (inventory_id, limit))
+            return [StockMovement(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def check_balances() -> List[dict]:
+        """Articles dont le stock ne correspond pas à la somme de leurs mouvements"""
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT i.id, i.item_name, i.quantity, COALESCE(SUM(m.quantity), 0) AS ledger
+                FROM inventory i
+                LEFT JOIN stock_movements m ON m.inventory_id = i.id
+                GROUP BY i.id
+                HAVING i.quantity != COALESCE(SUM(m.quantity), 0)
+            """)
+            return [{
+                "inventory_id": row['id'],
+                "item_name": row['item_name'],
+                "quantity": row['quantity'],
+                "ledger": row['ledger']
+            } for row in cur]
+        finally:
+            cur.close()
+            conn.close()
@@ -0,0 +1,24 @@
+class Summary:
+    """Représentation légère d'un enregistrement (id + libellé) pour les listes de sélection.
+
+    Les méthodes get_summaries() des modèles ne lisent que ces deux valeurs ;
+    l'objet complet se charge à la demande avec get_by_id().
+    """
+
+    __slots__ = ('id', 'label')
+
+    def __init__(self, id: int, label: str):
+        self.id = id
+        self.label = label
+
+    def __eq__(self, other):
+        return isinstance(other, Summary) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return self.label
+
+    def __repr__(self):
+        return f"Summary({self.id!r}, {self.label!r})"
@@ -1,8 +1,43 @@
+import bisect
 import hashlib
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import database
 from models.Badges import Badge
-from models.Roles import Role
+from models.StockMovement import StockMovement
+from models.Summary import Summary
+
+_DELETED_USERS = "(SELECT id FROM temp.bulk_delete_ids)"
+_OPEN_ASSIGNMENTS = f"returned_at IS NULL AND user_id IN {_DELETED_USERS}"
+# Demandes citées par le journal des mouvements de stock : conservées comme historique
+_LEDGER_REQUESTS = "(SELECT request_id FROM stock_movements WHERE request_id IS NOT NULL)"
+_KEPT_REQUESTS = f"(user_id NOT IN {_DELETED_USERS} OR id IN {_LEDGER_REQUESTS})"
+
+# Lignes dépendantes d'un utilisateur supprimé par User.bulk_delete, dans
+# l'ordre de nettoyage : (clé du rapport, table, condition)
+_USER_DELETE_CASCADE = [
+    ('equipment_assignments', 'equipment_assignments', _OPEN_ASSIGNMENTS),
+    ('equipment_requests', 'equipment_requests',
+     f"user_id IN {_DELETED_USERS} AND id NOT IN {_LEDGER_REQUESTS}"),
+    ('equipment_requests.processed_by', 'equipment_requests',
+     f"processed_by IN {_DELETED_USERS} AND {_KEPT_REQUESTS}"),
+    ('user_notes', 'user_notes', f"user_id IN {_DELETED_USERS}"),
+    ('user_notes.evaluator_id', 'user_notes',
+     f"evaluator_id IN {_DELETED_USERS} AND user_id NOT IN {_DELETED_USERS}"),
+    ('attendance', 'attendance', f"user_id IN {_DELETED_USERS}"),
+    ('activity_attendance', 'activity_attendance', f"user_id IN {_DELETED_USERS}"),
+    ('user_roles', 'user_roles', f"user_id IN {_DELETED_USERS}"),
+    ('parent_child', 'parent_child', f"parent_id IN {_DELETED_USERS} OR child_id IN {_DELETED_USERS}"),
+    ('user_stats', 'user_stats', f"user_id IN {_DELETED_USERS}"),
+    ('users', 'users', f"id IN {_DELETED_USERS}"),
+]
+# Lignes conservées et modifiées plutôt que supprimées : les attributions,
+# référencées par le journal des stocks, sont clôturées ; les références aux
+# comptes supprimés (demandes traitées, notes données) sont remises à NULL
+_USER_DELETE_UPDATE = {
+    'equipment_assignments': "returned_at = NOW()",
+    'equipment_requests.processed_by': "processed_by = NULL",
+    'user_notes.evaluator_id': "evaluator_id = NULL",
+}
 
 
 class User:
@@ -15,6 +50,10 @@ class User:
         self.status = status
         self.first_name = first_name or ""  # Default to empty string if None
         self.rank = rank or ""  # Default to empty string if None
+        # Rôles et permissions chargés à la demande, voir _load_access()
+        self._roles = None
+        self._permissions = None
+        self._access_generation = None
 
     def get_available_recipients(self) -> List['User']:
         """Retourne la liste des utilisateurs disponibles comme destinataires de messages"""
@@ -86,7 +125,7 @@ class User:
                 FROM users
                 ORDER BY name
             """)
-            return [User(*row) for row in cur.fetchall()]
+            return [User(*row) for row in cur]
         finally:
             cur.close()
             conn.close()
@@ -109,7 +148,102 @@ class User:
                 ORDER BY name
             """
             cur.execute(query, statuses)
-            return [User(*row) for row in cur.fetchall()]
+            return [User(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def get_summaries(statuses: List[str] = None, detail: str = 'status') -> List[Summary]:
+        """Liste légère (id, "nom (détail)") pour les sélecteurs, sans charger les autres colonnes"""
+        if detail not in ('status', 'email'):
+            raise ValueError(f"Détail non supporté: {detail}")
+
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            query = f"""
+                SELECT id, name || ' (' || {detail} || ')'
+                FROM users
+            """
+            params = []
+            if statuses:
+                query += f" WHERE status IN ({', '.join(['%s'] * len(statuses))})"
+                params.extend(statuses)
+            query += " ORDER BY name"
+            cur.execute(query, params)
+            return [Summary(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def search(text: str, limit: int = 20, detail: str = 'status') -> List[Summary]:
+        """Recherche plein texte (nom, prénom, email, grade) par préfixe, résultats classés"""
+        if detail not in ('status', 'email'):
+            raise ValueError(f"Détail non supporté: {detail}")
+        if (match := database.fts_query(text)) is None:
+            return []
+
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                SELECT u.id, u.name || ' (' || u.{detail} || ')'
+                FROM users_fts
+                JOIN users u ON u.id = users_fts.rowid
+                WHERE users_fts MATCH %s
+                ORDER BY users_fts.rank
+                LIMIT %s
+            """, (match, limit))
+            return [Summary(*row) for row in cur]
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def _page_query(after: Tuple[str, int] = None, limit: int = 25, search: str = None,
+                    statuses: List[str] = None) -> Tuple[str, list]:
+        """Requête et paramètres d'une page de page() (aussi contrôlée par check_query_plans.py)"""
+        query = """
+            SELECT id, name, email, password_hash, status, first_name, rank
+            FROM users
+            WHERE 1 = 1
+        """
+        params = []
+        if after is not None:
+            query += " AND (name, id) > (%s, %s)"
+            params.extend(after)
+        if (match := database.fts_query(search)) is not None:
+            query += " AND id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH %s)"
+            params.append(match)
+        if statuses:
+            query += f" AND status IN ({', '.join(['%s'] * len(statuses))})"
+            params.extend(statuses)
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        query += " ORDER BY name, id LIMIT %s"
+        params.append(limit + 1)
+        return query, params
+
+    @staticmethod
+    def page(after: Tuple[str, int] = None, limit: int = 25, search: str = None,
+             statuses: List[str] = None) -> Tuple[List['User'], Optional[Tuple[str, int]]]:
+        """Page d'utilisateurs triée par nom, par pagination à curseur (keyset).
+
+        after est le curseur (nom, id) du dernier utilisateur de la page
+        précédente : il porte les valeurs de tri elles-mêmes, la page suivante
+        reste donc juste si cet utilisateur a été supprimé entre-temps.
+        Retourne la page et le curseur suivant (None s'il n'y en a pas).
+        """
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(*User._page_query(after, limit, search, statuses))
+            users = [User(*row) for row in cur]
+            if len(users) > limit:
+                users = users[:limit]
+                return users, (users[-1].name, users[-1].id)
+            return users, None
         finally:
             cur.close()
             conn.close()
@@ -167,6 +301,8 @@ class User:
                 self.password_hash = hashlib.sha256(password.encode()).hexdigest()
 
             conn.commit()
+            if roles is not None:
+                database.bump_generation('user_roles')
             return True
 
         except Exception as e:
@@ -177,45 +313,143 @@ class User:
             cur.close()
             conn.close()
 
+    @staticmethod
+    def _stage_bulk_delete(cur, user_ids: List[int]) -> List[str]:
+        """Place les utilisateurs existants dans temp.bulk_delete_ids ; retourne les introuvables"""
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_delete_ids (id INTEGER PRIMARY KEY)")
+        cur.execute("DELETE FROM temp.bulk_delete_ids")
+        cur.executemany("""
+            INSERT INTO temp.bulk_delete_ids (id)
+            SELECT id FROM users WHERE id = %s
+        """, [(user_id,) for user_id in user_ids])
+        cur.execute("SELECT id FROM temp.bulk_delete_ids")
+        found = {row[0] for row in cur}
+        return [f"Utilisateur introuvable: {user_id}" for user_id in user_ids if user_id not in found]
+
+    @staticmethod
+    def bulk_delete(user_ids: List[int], dry_run: bool = False) -> Tuple[Dict[str, int], List[str]]:
+        """Supprime des utilisateurs et toutes les lignes qui en dépendent, en une transaction.
+
+        Les identifiants sont placés dans une table temporaire et chaque table
+        dépendante est nettoyée par une seule instruction ensembliste. Le
+        matériel encore attribué aux utilisateurs supprimés est remis en stock
+        par StockMovement dans la même transaction d'écriture ; leurs
+        attributions et les demandes citées par le journal des stocks sont
+        conservées comme historique. Retourne le nombre de lignes touchées par
+        table et les erreurs ; avec dry_run, seuls les comptes sont calculés.
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return {}, []
+
+        if dry_run:
+            conn = database.get_connection()
+            cur = conn.cursor()
+            try:
+                errors = User._stage_bulk_delete(cur, user_ids)
+                counts = {}
+                cur.execute(f"SELECT COUNT(DISTINCT inventory_id) FROM equipment_assignments WHERE {_OPEN_ASSIGNMENTS}")
+                counts['inventory'] = cur.fetchone()[0]
+                for key, table, condition in _USER_DELETE_CASCADE:
+                    cur.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}")
+                    counts[key] = cur.fetchone()[0]
+                return counts, errors
+            except Exception as e:
+                return {}, [f"Erreur lors de la suppression: {str(e)}"]
+            finally:
+                conn.rollback()
+                cur.close()
+                conn.close()
+
+        try:
+            # Verrou d'écriture pris avant la première lecture : pas de
+            # passage lecture -> écriture refusé (SQLITE_BUSY) sous concurrence
+            with database.immediate_transaction() as cur:
+                errors = User._stage_bulk_delete(cur, user_ids)
+                counts = {}
+
+                # Retour en stock avant la clôture des attributions : une ligne
+                # du journal par attribution, un seul UPDATE par article
+                cur.execute(f"""
+                    SELECT id, inventory_id, user_id, quantity
+                    FROM equipment_assignments
+                    WHERE {_OPEN_ASSIGNMENTS}
+                    ORDER BY inventory_id, id
+                """)
+                returns: Dict[int, List[dict]] = {}
+                for assignment_id, inventory_id, user_id, quantity in cur.fetchall():
+                    returns.setdefault(inventory_id, []).append({
+                        'quantity': quantity,
+                        'user_id': user_id,
+                        'assignment_id': assignment_id,
+                        'reason': 'Suppression de compte'
+                    })
+                for inventory_id, movements in returns.items():
+                    StockMovement.apply_many(cur, inventory_id, 'return', movements)
+                counts['inventory'] = len(returns)
+
+                for key, table, condition in _USER_DELETE_CASCADE:
+                    if key in _USER_DELETE_UPDATE:
+                        cur.execute(f"UPDATE {table} SET {_USER_DELETE_UPDATE[key]} WHERE {condition}")
+                    else:
+                        cur.execute(f"DELETE FROM {table} WHERE {condition}")
+                    counts[key] = cur.rowcount
+                # La table temporaire est vidée dans la transaction : un échec l'annule avec le reste
+                cur.execute("DELETE FROM temp.bulk_delete_ids")
+        except Exception as e:
+            return {}, [f"Erreur lors de la suppression: {str(e)}"]
+
+        database.bump_generation('users', 'user_roles', 'user_notes', 'attendance', 'inventory')
+        return counts, errors
+
     def verify_password(self, password: str) -> bool:
         hashed = hashlib.sha256(password.encode()).hexdigest()
         return self.password_hash == hashed
 
-    def has_role(self, role_name: str) -> bool:
+    def _load_access(self):
+        """Charge tous les rôles et permissions de l'utilisateur en une seule requête.
+
+        Le résultat est conservé sur l'objet (donc dans st.session_state)
+        jusqu'à ce qu'une association de rôle ou de permission change dans
+        le processus.
+        """
+        current = database.generation('user_roles', 'role_permissions', 'roles')
+        if self._access_generation == current and self._roles is not None:
+            return
+
         conn = database.get_connection()
         cur = conn.cursor()
         try:
             cur.execute("""
-                SELECT EXISTS(
-                    SELECT 1 
-                    FROM user_roles ur
-                    JOIN roles r ON ur.role_id = r.id
-                    WHERE ur.user_id = %s AND r.name = %s
-                )
-            """, (self.id, role_name))
-            return cur.fetchone()[0]
+                SELECT r.name AS role_name, p.name AS permission_name
+                FROM user_roles ur
+                JOIN roles r ON ur.role_id = r.id
+                LEFT JOIN role_permissions rp ON r.id = rp.role_id
+                LEFT JOIN permissions p ON rp.permission_id = p.id
+                WHERE ur.user_id = %s
+            """, (self.id,))
+            roles = set()
+            permissions = set()
+            for role_name, permission_name in cur:
+                roles.add(role_name)
+                if permission_name is not None:
+                    permissions.add(permission_name)
         finally:
             cur.close()
             conn.close()
 
+        self._roles = frozenset(roles)
+        self._permissions = frozenset(permissions)
+        self._access_generation = current
+
+    def has_role(self, role_name: str) -> bool:
+        self._load_access()
+        return role_name in self._roles
+
     def has_permission(self, permission_name: str) -> bool:
         """Check if user has a specific permission through any of their roles"""
-        conn = database.get_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute("""
-                SELECT EXISTS(
-                    SELECT 1 
-                    FROM user_roles ur
-                    JOIN role_permissions rp ON ur.role_id = rp.role_id
-                    JOIN permissions p ON rp.permission_id = p.id
-                    WHERE ur.user_id = %s AND p.name = %s
-                )
-            """, (self.id, permission_name))
-            return cur.fetchone()[0]
-        finally:
-            cur.close()
-            conn.close()
+        self._load_access()
+        return permission_name in self._permissions
 
     def get_children(self) -> List['User']:
         """Récupérer les enfants d'un parent."""
@@ -237,57 +471,85 @@ class User:
             cur.close()
             conn.close()
 
-    def get_points(self) -> dict:
-        """Calculate user points and level based on their activities and notes."""
-        conn = database.get_connection()
-        cur = conn.cursor()
-        try:
-            # Get points from notes (rating 1-5 = 2-10 points)
-            cur.execute("""
-                SELECT COALESCE(SUM(rating * 2), 0)
-                FROM user_notes
-                WHERE user_id = %s
-            """, (self.id,))
-            note_points = cur.fetchone()[0]
-
-            # Get points from attendance (10 points per attendance)
-            cur.execute("""
-                SELECT COUNT(*) * 10
-                FROM attendance
-                WHERE user_id = %s
-            """, (self.id,))
-            attendance_points = cur.fetchone()[0]
+    @staticmethod
+    def level_for_points(points: int) -> int:
+        """Level N requires (N*10)^2 points: 100 points for level 1, 400 for level 2, 900 for level 3..."""
+        return max(1, int((points ** 0.5) / 10))  # Minimum level is 1
 
-            total_points = note_points + attendance_points
+    @staticmethod
+    def get_progress(user_ids: List[int]) -> Dict[int, dict]:
+        """Points, niveau et badges gagnés de plusieurs utilisateurs, en une seule requête.
 
-            # Calculate level: level N requires (N*10)^2 points
-            # So if you have 100 points, you're level 1 (requires 100 points)
-            # Level 2 requires 400 points, level 3 requires 900 points, etc.
-            level = int((total_points ** 0.5) / 10)  # Integer division to get current level
+        Les points sont lus dans user_stats (tenue à jour par triggers sur
+        user_notes et attendance) ; les badges viennent du cache de référence.
+        Retourne {user_id: {'points': int, 'level': int, 'badges': [Badge, ...]}}
+        """
+        if not user_ids:
+            return {}
 
-            return {
-                "points": int(total_points),
-                "level": max(1, level)  # Minimum level is 1
-            }
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            cur.execute(f"""
+                SELECT user_id, note_points + attendance_count * 10
+                FROM user_stats
+                WHERE user_id IN ({placeholders})
+            """, list(user_ids))
+            points_by_user = dict(cur.fetchall())
         finally:
             cur.close()
             conn.close()
 
+        # Badges triés par points requis : ceux gagnés forment un préfixe de la liste
+        badges = Badge.get_all()
+        thresholds = [badge.points_required for badge in badges]
+        progress = {}
+        for user_id in user_ids:
+            points = int(points_by_user.get(user_id, 0))
+            earned = badges[:bisect.bisect_right(thresholds, points)]
+            progress[user_id] = {
+                "points": points,
+                "level": User.level_for_points(points),
+                "badges": earned[::-1]
+            }
+        return progress
+
+    def get_points(self) -> dict:
+        """Calculate user points and level based on their activities and notes."""
+        progress = User.get_progress([self.id])[self.id]
+        return {"points": progress["points"], "level": progress["level"]}
+
     def get_badges(self) -> List['Badge']:
         """Get all badges earned by the user based on points."""
-        points_info = self.get_points()
-        total_points = points_info["points"]
+        return User.get_progress([self.id])[self.id]["badges"]
 
+    @staticmethod
+    def get_leaderboard(limit: int = 10, statuses: List[str] = None) -> List[dict]:
+        """Classement par points (vue leaderboard), ex aequo au même rang"""
         conn = database.get_connection()
         cur = conn.cursor()
         try:
-            cur.execute("""
-                SELECT id, name, description, icon_name, points_required
-                FROM badges
-                WHERE points_required <= %s
-                ORDER BY points_required DESC
-            """, (total_points,))
-            return [Badge(*row) for row in cur.fetchall()]
+            query = """
+                SELECT user_id, name, first_name, status, points,
+                       RANK() OVER (ORDER BY points DESC) AS position
+                FROM leaderboard
+            """
+            params = []
+            if statuses:
+                query += f" WHERE status IN ({', '.join(['%s'] * len(statuses))})"
+                params.extend(statuses)
+            query += " ORDER BY points DESC, name LIMIT %s"
+            params.append(limit)
+            cur.execute(query, params)
+            return [{
+                "rank": row['position'],
+                "user_id": row['user_id'],
+                "name": f"{row['first_name']} {row['name']}".strip() if row['first_name'] else row['name'],
+                "status": row['status'],
+                "points": row['points'],
+                "level": User.level_for_points(row['points'])
+            } for row in cur]
         finally:
             cur.close()
             conn.close()
@@ -299,9 +561,9 @@ class User:
         try:
             query = """
                 SELECT n.id, n.user_id, n.note_date, n.note_type, n.rating, n.appreciation, 
-                       n.evaluator_id, u.name as evaluator_name
+                       n.evaluator_id, COALESCE(u.name, 'Utilisateur supprimé') as evaluator_name
                 FROM user_notes n
-                JOIN users u ON n.evaluator_id = u.id
+                LEFT JOIN users u ON n.evaluator_id = u.id
                 WHERE n.user_id = %s
             """
 
@@ -347,6 +609,7 @@ class User:
                 RETURNING id
             """, (self.id, date, note_type, rating, appreciation, evaluator_id))
             conn.commit()
+            database.bump_generation('user_notes')
             return cur.fetchone()[0]
         except Exception as e:
             conn.rollback()
@@ -366,6 +629,7 @@ class User:
                 RETURNING id
             """, (note_id, self.id))
             conn.commit()
+            database.bump_generation('user_notes')
             return cur.fetchone() is not None
         except Exception as e:
             conn.rollback()
@@ -376,27 +640,10 @@ class User:
 
     def get_permissions(self) -> List[str]:
         """Get all permissions for this user through their roles"""
-        permissions = []
-        roles = self.get_roles()
-        for role_name in roles:
-            role = Role.get_by_name(role_name)
-            if role:
-                permissions.extend(role.get_permissions())
-        return permissions
+        self._load_access()
+        return sorted(self._permissions)
 
     def get_roles(self) -> List[str]:
         """Get all roles for this user"""
-        conn = database.get_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute("""
-                SELECT DISTINCT r.name
-                FROM users u
-                JOIN user_roles ur ON u.id = ur.user_id
-                JOIN roles r ON ur.role_id = r.id
-                WHERE u.id = %s
-            """, (self.id,))
-            return [row[0] for row in cur.fetchall()]
-        finally:
-            cur.close()
-            conn.close()
+        self._load_access()
+        return sorted(self._roles)
@@ -1,6 +1,7 @@
 import streamlit as st
 import database
 from models import User
+from models import Activity
 import logging
 
 # Configure logging
@@ -60,10 +61,11 @@ def main():
         with col1:
             date_filter = st.date_input("Date")
         with col2:
-            # Exemple de filtre par activité (à remplacer par les vraies activités)
+            # Filtre par activité (identifiant et libellé seulement)
             activity_filter = st.selectbox(
                 "Activité", 
-                ["Toutes les activités", "Formation militaire", "Sport", "Activité culturelle"]
+                ["Toutes les activités"] + Activity.get_summaries(),
+                format_func=str
             )
         with col3:
             # Exemple de filtre par statut (à remplacer par les vrais statuts)
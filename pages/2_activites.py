@@ -4,7 +4,7 @@ import streamlit as st
 from utils.authentification import check_authentication
 
 from models import Activity
-from models import Inventory
+from models import InventoryCatalog
 
 
 def main():
@@ -33,7 +33,7 @@ def main():
                 # Équipement requis
                 st.subheader("Équipement requis")
                 equipment_list = []
-                inventory_items = Inventory.get_all()
+                inventory_items = InventoryCatalog.current().items
 
                 if inventory_items:
                     for item in inventory_items:
@@ -131,7 +131,7 @@ def main():
                     new_equipment_list = []
                     current_equipment = {eq[0]: eq[3] for eq in equipment}  # id: quantity
 
-                    inventory_items = Inventory.get_all()
+                    inventory_items = InventoryCatalog.current().items
                     if inventory_items:
                         for item in inventory_items:
                             col1, col2 = st.columns([3, 1])
@@ -1,9 +1,12 @@
 import streamlit as st
+from utils.blob_store import resolve_image
+from utils.pagination import keyset_pages, PAGE_SIZE
 from models import EquipmentAssignment
 from models import EquipmentRequest
 from models import User
 from models import Inventory
 from models import InventoryCategory
+from models import InventoryCatalog
 from models import CategoryField
 
 
@@ -15,26 +18,22 @@ def check_authentication():
 
 def affichage_parents(user):
     st.subheader("Équipements de vos enfants")
-    # Récupérer uniquement les équipements des enfants du parent
-    items = Inventory.get_by_parent(user.id)
+    # Récupérer en une seule requête les équipements des enfants du parent
+    equipment = EquipmentAssignment.get_for_parent(user.id)
 
-    if items:
-        for item in items:
-            with st.expander(f"{item.item_name} - {item.quantity} {item.unit}"):
+    if equipment:
+        for entry in equipment:
+            item = entry['item']
+            with st.expander(f"{item.item_name} - {entry['quantity']} {item.unit}"):
                 st.write(f"**Catégorie:** {item.category}")
-                st.write(f"**Stock actuel:** {item.quantity} {item.unit}")
+                st.write(f"**Quantité affectée:** {entry['quantity']} {item.unit}")
 
                 # Afficher les assignations pour les enfants du parent
-                children = user.get_children()
-                for child in children:
-                    assignments = EquipmentAssignment.get_user_assignments(child.id)
-                    child_assignments = [a for a in assignments if a.inventory_id == item.id]
-
-                    if child_assignments:
-                        st.write(f"**Équipement assigné à {child.name}:**")
-                        for assignment in child_assignments:
-                            st.write(f"- Quantité: {assignment.quantity} {item.unit}")
-                            st.write(f"- Date d'assignation: {assignment.assigned_at.strftime('%d/%m/%Y')}")
+                for child_entry in entry['children']:
+                    st.write(f"**Équipement assigné à {child_entry['child'].name}:**")
+                    for assignment in child_entry['assignments']:
+                        st.write(f"- Quantité: {assignment.quantity} {item.unit}")
+                        st.write(f"- Date d'assignation: {assignment.assigned_at.strftime('%d/%m/%Y')}")
     else:
         st.info("Aucun équipement n'est actuellement assigné à vos enfants")
 
@@ -49,9 +48,9 @@ def affichage_cadets(user):
         assignments = EquipmentAssignment.get_user_assignments(user.id)
 
         if assignments:
-            items = Inventory.get_all()  # Pour avoir les détails des items
+            catalog = InventoryCatalog.current()  # Pour avoir les détails des items
             for assignment in assignments:
-                item = next((i for i in items if i.id == assignment.inventory_id), None)
+                item = catalog.get(assignment.inventory_id)
                 if item:
                     with st.expander(f"{item.item_name} - {assignment.quantity} {item.unit}"):
                         st.write(f"**Catégorie:** {item.category}")
@@ -93,11 +92,11 @@ def affichage_cadets(user):
                 equipment_id = st.session_state.selected_item_for_change.id
             else:
                 # Pour une nouvelle demande, permettre de choisir l'équipement
-                items = Inventory.get_all()
+                items = Inventory.get_summaries()
                 equipment = st.selectbox(
                     "Équipement souhaité",
                     items,
-                    format_func=lambda x: f"{x.item_name} ({x.category})"
+                    format_func=lambda x: x.label
                 )
                 equipment_id = equipment.id if equipment else None
 
@@ -195,7 +194,17 @@ def affichage_gestionnaire():
 
         # Afficher l'inventaire existant
         st.subheader("Articles en stock")
-        items = Inventory.get_all()
+        catalog = InventoryCatalog.current()
+        if catalog.low_stock:
+            st.warning(f"⚠️ {len(catalog.low_stock)} article(s) en stock bas")
+
+        # Recherche et pagination côté base : seule la page affichée est chargée
+        item_search = st.text_input("Rechercher un article", key="inventory_search")
+        items = keyset_pages(
+            "inventory_items",
+            lambda after: Inventory.page(after, PAGE_SIZE, search=item_search or None),
+            filters=item_search
+        )
         if items:
             for item in items:
                 with st.expander(f"{item.item_name} - {item.quantity} {item.unit}"):
@@ -205,9 +214,12 @@ def affichage_gestionnaire():
                         st.write(f"**Stock actuel:** {item.quantity} {item.unit}")
                         st.write(f"**Seuil d'alerte:** {item.min_quantity} {item.unit}")
 
-                        # Afficher la photo si disponible
-                        if hasattr(item, 'photo_url') and item.photo_url:
-                            st.image(item.photo_url, caption=item.item_name, width=300)
+                        # Charger la photo seulement à la demande
+                        show_photo = False
+                        if item.photo_url:
+                            show_photo = st.checkbox("📷 Afficher la photo", key=f"show_photo_{item.id}")
+                            if show_photo and (photo := resolve_image(item.photo_url)):
+                                st.image(photo, caption=item.item_name, width=300)
 
                         if item.quantity <= item.min_quantity:
                             st.warning("⚠️ Stock bas")
@@ -224,11 +236,11 @@ def affichage_gestionnaire():
                                 st.write("Photo de l'article")
 
                                 # Déterminer si une photo existe déjà
-                                has_existing_photo = hasattr(item, 'photo_url') and item.photo_url
+                                has_existing_photo = bool(item.photo_url)
 
-                                # Afficher la photo actuelle s'il y en a une
-                                if has_existing_photo:
-                                    st.image(item.photo_url, caption="Photo actuelle", width=150)
+                                # Afficher la photo actuelle si elle a été chargée
+                                if show_photo and (photo := resolve_image(item.photo_url)):
+                                    st.image(photo, caption="Photo actuelle", width=150)
 
                                 photo_option = st.radio(
                                     "Modifier la photo",
@@ -255,7 +267,7 @@ def affichage_gestionnaire():
                                         # Prévisualiser l'image téléchargée
                                         st.image(new_photo_data, caption="Nouvelle photo", width=150)
                                 elif photo_option == "Utiliser une URL":
-                                    current_url = item.photo_url if has_existing_photo else ""
+                                    current_url = item.photo_url if has_existing_photo and item.photo_url.startswith('http') else ""
                                     new_photo_data = st.text_input(
                                         "URL de la photo",
                                         value=current_url,
@@ -265,7 +277,8 @@ def affichage_gestionnaire():
 
                                 if st.form_submit_button("Mettre à jour"):
                                     # Mettre à jour la quantité
-                                    quantity_updated = Inventory.update_quantity(item.id, new_quantity)
+                                    quantity_updated = Inventory.update_quantity(item.id, new_quantity,
+                                                                                performed_by=st.session_state.user.id)
 
                                     # Mettre à jour la photo si nécessaire
                                     photo_updated = True
@@ -291,7 +304,7 @@ def affichage_gestionnaire():
                                         st.rerun()
                                     else:
                                         st.error(
-                                            "Impossible de supprimer l'article. Il est peut-être utilisé dans une activité ou assigné à un utilisateur.")
+                                            "Impossible de supprimer l'article : une partie du stock est encore affectée à des utilisateurs.")
         else:
             st.info("Aucun article en stock. Utilisez le formulaire ci-dessus pour ajouter des articles.")
 
@@ -451,9 +464,11 @@ def affichage_gestionnaire():
         st.subheader("Gestion des équipements")
 
         # Récupérer tous les équipements une seule fois
-        items = Inventory.get_all()
+        catalog = InventoryCatalog.current()
+        items = catalog.items
 
-        tab3_1, tab3_2, tab3_3 = st.tabs(["Mouvements de stock", "Affecter équipement", "Équipements affectés"])
+        tab3_1, tab3_2, tab3_3, tab3_4 = st.tabs(
+            ["Mouvements de stock", "Affecter équipement", "Équipements affectés", "Distribution groupée"])
 
         with tab3_1:
             # Mouvements de stock
@@ -468,16 +483,20 @@ def affichage_gestionnaire():
                     movement_type = st.selectbox("Type de mouvement", ["Entrée", "Sortie"])
                     quantity = st.number_input("Quantité", min_value=1)
 
+                    reason = st.text_input("Motif (optionnel)")
+
                     if st.form_submit_button("Enregistrer"):
-                        new_quantity = item.quantity + quantity if movement_type == "Entrée" else item.quantity - quantity
-                        if new_quantity >= 0:
-                            if Inventory.update_quantity(item.id, new_quantity):
-                                st.success("Mouvement enregistré!")
-                                st.rerun()
-                            else:
-                                st.error("Erreur lors de l'enregistrement du mouvement")
-                        else:
+                        # Écart appliqué au stock réel, pas au stock affiché dans le formulaire
+                        delta = quantity if movement_type == "Entrée" else -quantity
+                        try:
+                            Inventory.adjust_quantity(item.id, delta, performed_by=st.session_state.user.id,
+                                                     reason=reason or None)
+                            st.success("Mouvement enregistré!")
+                            st.rerun()
+                        except ValueError:
                             st.error("Stock insuffisant pour cette sortie")
+                        except Exception as e:
+                            st.error(f"Erreur lors de l'enregistrement du mouvement: {str(e)}")
                 else:
                     st.warning("Aucun article en stock")
 
@@ -485,17 +504,17 @@ def affichage_gestionnaire():
             # Affecter équipement
             with st.form("assign_equipment"):
                 # Sélection de l'utilisateur
-                users = User.get_all()
+                users = User.get_summaries()
                 selected_user = st.selectbox(
                     "Utilisateur",
                     users,
-                    format_func=lambda x: f"{x.name} ({x.status})",
+                    format_func=lambda x: x.label,
                     key="assignment_user"
                 )
 
                 # Sélection de l'équipement
                 if items:
-                    available_items = [item for item in items if item.quantity > 0]
+                    available_items = catalog.available()
                     if available_items:
                         selected_item = st.selectbox(
                             "Équipement",
@@ -517,9 +536,10 @@ def affichage_gestionnaire():
                                 EquipmentAssignment.assign_to_user(
                                     selected_item.id,
                                     selected_user.id,
-                                    quantity
+                                    quantity,
+                                    performed_by=st.session_state.user.id
                                 )
-                                st.success(f"Équipement affecté à {selected_user.name}")
+                                st.success(f"Équipement affecté à {selected_user.label}")
                                 st.rerun()
                             except ValueError as e:
                                 st.error(str(e))
@@ -536,34 +556,29 @@ def affichage_gestionnaire():
             # Équipements affectés
 
             # Permettre aux administrateurs de voir les équipements de tous les utilisateurs
-            users = User.get_all()
-            # Créer une liste avec tout les utilisateurs
-            user_list = [u for u in users]
-
             # Champ de recherche pour filtrer les utilisateurs
             search_query = st.text_input("Rechercher un utilisateur", "")
 
-            # Filtrer les utilisateurs en fonction de la recherche
+            # Recherche plein texte côté base (nom, prénom, email, grade)
             if search_query:
-                filtered_users = [u for u in user_list if search_query.lower() in u.name.lower()]
+                filtered_users = User.search(search_query, limit=50)
             else:
-                filtered_users = user_list
+                filtered_users = User.get_summaries()
 
             # Sélection de l'utilisateur
             selected_user = st.selectbox(
                 "Voir les équipements de",
                 filtered_users,
-                format_func=lambda x: f"{x.name} ({x.status})",
+                format_func=lambda x: x.label,
                 index=0
             )
 
             # Afficher les équipements de l'utilisateur sélectionné
             assignments = EquipmentAssignment.get_user_assignments(selected_user.id)
             if assignments:
-                st.write(f"Équipements affectés à : {selected_user.name}")
-                items = Inventory.get_all()  # Pour avoir les détails des items
+                st.write(f"Équipements affectés à : {selected_user.label}")
                 for assignment in assignments:
-                    item = next((i for i in items if i.id == assignment.inventory_id), None)
+                    item = catalog.get(assignment.inventory_id)
                     if item:
                         with st.expander(f"{item.item_name} - {assignment.quantity} {item.unit}"):
                             st.write(f"**Catégorie:** {item.category}")
@@ -573,74 +588,164 @@ def affichage_gestionnaire():
 
                             # Option de retour pour les administrateurs/magasiniers
                             if st.button("Retourner", key=f"return_{assignment.id}"):
-                                if assignment.return_equipment():
+                                if assignment.return_equipment(performed_by=st.session_state.user.id):
                                     st.success("Équipement retourné avec succès!")
                                     st.rerun()
                                 else:
                                     st.error("Erreur lors du retour de l'équipement")
             else:
-                st.info(f"Aucun équipement n'est actuellement assigné à {selected_user.name}")
+                st.info(f"Aucun équipement n'est actuellement assigné à {selected_user.label}")
+
+        with tab3_4:
+            # Distribution du même lot d'équipements à toute une promotion
+            statuses = st.multiselect(
+                "Statuts",
+                ["cadet", "AMC", "animateur"],
+                default=["cadet"],
+                key="bulk_statuses"
+            )
+            candidates = User.get_summaries(statuses) if statuses else []
+            all_users = st.checkbox(f"Tous les utilisateurs sélectionnés ({len(candidates)})", value=True,
+                                    key="bulk_all_users")
+            bulk_users = candidates if all_users else st.multiselect(
+                "Utilisateurs",
+                candidates,
+                format_func=lambda x: x.label,
+                key="bulk_users"
+            )
+
+            bulk_items = st.multiselect(
+                "Équipements",
+                catalog.available(),
+                format_func=lambda x: f"{x.item_name} (Disponible: {x.quantity} {x.unit})",
+                key="bulk_items"
+            )
+
+            with st.form("bulk_assign"):
+                quantities = {
+                    item.id: st.number_input(
+                        f"{item.item_name} - quantité par utilisateur",
+                        min_value=1,
+                        value=1,
+                        key=f"bulk_qty_{item.id}"
+                    )
+                    for item in bulk_items
+                }
+
+                if st.form_submit_button("Distribuer", disabled=not (bulk_users and bulk_items)):
+                    try:
+                        matrix = EquipmentAssignment.bulk_assign(
+                            [u.id for u in bulk_users],
+                            list(quantities.items()),
+                            performed_by=st.session_state.user.id
+                        )
+                    except ValueError as e:
+                        st.error(str(e))
+                    except Exception as e:
+                        st.error(f"Erreur lors de la distribution: {str(e)}")
+                    else:
+                        st.success(f"Équipements distribués à {len(matrix)} utilisateur(s)")
+                        st.dataframe(
+                            [
+                                {"Utilisateur": u.label, **{
+                                    item.item_name: quantities[item.id] if item.id in matrix[u.id] else 0
+                                    for item in bulk_items
+                                }}
+                                for u in bulk_users
+                            ],
+                            hide_index=True,
+                            use_container_width=True
+                        )
 
     with tab4:
         st.subheader("Demandes d'équipement en attente")
 
-        # Récupérer toutes les demandes en attente
-        pending_requests = EquipmentRequest.get_pending_requests()
-
-        if pending_requests:
-            for request in pending_requests:
-                # Récupérer les informations de l'utilisateur et de l'équipement
-                user = User.get_by_id(request.user_id)
-                equipment = next((item for item in Inventory.get_all() if item.id == request.equipment_id), None)
-
-                if user and equipment and request.created_at:  # Add check for created_at
-                    with st.expander(f"Demande de {user.name} - {equipment.item_name}"):
-                        col1, col2 = st.columns([3, 1])
-
-                        with col1:
-                            st.write(f"**Type de demande:** {request.request_type}")
-                            st.write(f"**Équipement:** {equipment.item_name}")
-                            st.write(f"**Quantité demandée:** {request.quantity}")
-                            st.write(f"**Raison:** {request.reason}")
-                            if request.created_at:  # Double-check before using strftime
-                                st.write(f"**Date de la demande:** {request.created_at.strftime('%d/%m/%Y %H:%M')}")
-                            else:
-                                st.write("**Date de la demande:** Non disponible")
+        # Demandes, demandeurs et articles chargés en une seule requête
+        pending = EquipmentRequest.get_pending_details()
 
-                        with col2:
-                            # Formulaire pour approuver/refuser la demande
-                            with st.form(key=f"request_action_{request.id}"):
-                                action = st.radio(
-                                    "Action",
-                                    ["Approuver", "Refuser"],
-                                    key=f"action_{request.id}"
-                                )
-                                reason = st.text_area(
-                                    "Raison du refus",
-                                    key=f"reason_{request.id}",
-                                    disabled=action == "Approuver"
-                                )
-
-                                if st.form_submit_button("Valider"):
-                                    if action == "Approuver":
-                                        success, message = request.approve()
-                                    else:
-                                        if not reason:
-                                            st.error("Veuillez indiquer la raison du refus")
-                                            st.stop()
-                                        success, message = request.reject(reason)
+        if pending:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                item_filter = st.multiselect(
+                    "Équipements",
+                    sorted({entry['item'].item_name for entry in pending}),
+                    key="requests_item_filter"
+                )
+            with col2:
+                type_filter = st.multiselect(
+                    "Type de demande",
+                    sorted({entry['request'].request_type for entry in pending}),
+                    key="requests_type_filter"
+                )
+            with col3:
+                status_filter = st.multiselect(
+                    "Statut du demandeur",
+                    sorted({entry['user'].status for entry in pending}),
+                    key="requests_status_filter"
+                )
 
-                                    if success:
-                                        st.success(message)
-                                        st.rerun()
-                                    else:
-                                        st.error(message)
-                else:
-                    st.warning("Certaines informations de la demande sont manquantes")
+            filtered = [
+                entry for entry in pending
+                if (not item_filter or entry['item'].item_name in item_filter)
+                and (not type_filter or entry['request'].request_type in type_filter)
+                and (not status_filter or entry['user'].status in status_filter)
+            ]
+
+            # Rien n'est coché d'office, et l'éditeur est propre à la liste affichée : les
+            # cases cochées (gardées par position) ne glissent pas sur d'autres demandes
+            # quand un filtre ou la liste des demandes en attente change
+            check_all = st.checkbox(f"Cocher les {len(filtered)} demande(s) affichée(s)", key="requests_check_all")
+            shown_ids = tuple(entry['request'].id for entry in filtered)
+            edited = st.data_editor(
+                [{
+                    "Traiter": check_all,
+                    "N°": entry['request'].id,
+                    "Demandeur": entry['user'].name,
+                    "Équipement": entry['item'].item_name,
+                    "Type": entry['request'].request_type,
+                    "Quantité": entry['request'].quantity,
+                    "En stock": entry['item'].quantity,
+                    "Raison": entry['request'].reason,
+                    "Date": entry['request'].created_at.strftime('%d/%m/%Y %H:%M') if entry['request'].created_at else ""
+                } for entry in filtered],
+                disabled=["N°", "Demandeur", "Équipement", "Type", "Quantité", "En stock", "Raison", "Date"],
+                hide_index=True,
+                use_container_width=True,
+                key=f"requests_editor_{hash((shown_ids, check_all))}"
+            )
+            selected_ids = [row["N°"] for row in edited if row["Traiter"]]
+            st.write(f"{len(selected_ids)} demande(s) sélectionnée(s) sur {len(pending)} en attente")
+
+            with st.form("requests_action"):
+                action = st.radio("Action", ["Approuver", "Refuser"], horizontal=True)
+                reason = st.text_area("Raison du refus")
+
+                if st.form_submit_button("Valider", disabled=not selected_ids):
+                    if action == "Approuver":
+                        try:
+                            approved, errors = EquipmentRequest.approve_many(
+                                selected_ids, processed_by=st.session_state.user.id)
+                        except Exception as e:
+                            st.error(f"Erreur lors de l'approbation: {str(e)}")
+                        else:
+                            if errors:
+                                st.error("\n".join(errors))
+                            if approved:
+                                st.success(f"{len(approved)} demande(s) approuvée(s) et équipement(s) assigné(s)")
+                                st.rerun()
+                    elif not reason:
+                        st.error("Veuillez indiquer la raison du refus")
+                    else:
+                        try:
+                            rejected = EquipmentRequest.reject_many(
+                                selected_ids, reason, processed_by=st.session_state.user.id)
+                            st.success(f"{rejected} demande(s) rejetée(s)")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Erreur lors du rejet: {str(e)}")
         else:
             st.info("Aucune demande en attente")
 
-
 def main():
     check_authentication()
 
@@ -653,11 +758,11 @@ def main():
 
     # Si l'utilisateur est un parent, afficher uniquement les équipements des enfants
     elif user.status == 'parent':
-        affichage_parents()
+        affichage_parents(user)
 
     # Pour tous les autres utilisateurs (cadet, AMC), afficher uniquement leurs équipements
     else:
-        affichage_cadets()
+        affichage_cadets(user)
 
     if __name__ == "__main__":
         main()
@@ -1,5 +1,8 @@
+import os
+
 import streamlit as st
-from utils.pdf import PDFGenerator
+from utils.jobs import job_queue
+from utils.reports import REPORT_TYPES, build_report
 from datetime import datetime, timedelta
 
 def check_authentication():
@@ -19,7 +22,7 @@ def main():
     
     report_type = st.selectbox(
         "Type de rapport",
-        ["Présences", "Activités", "Stocks", "Communications"]
+        REPORT_TYPES
     )
     
     col1, col2 = st.columns(2)
@@ -34,41 +37,53 @@ def main():
             value=datetime.now()
         )
     
+    try:
+        # Calculé une fois par (type, période), puis servi depuis le cache
+        report = build_report(report_type, start_date, end_date)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    
     if st.button("Générer le rapport"):
-        # TODO: Récupérer les vraies données depuis la base de données
-        data = [
-            "Ligne 1 du rapport",
-            "Ligne 2 du rapport",
-            "Ligne 3 du rapport"
-        ]
-        
-        pdf = PDFGenerator.generate_pdf_report(data, report_type)
-        
-        st.download_button(
-            "Télécharger le rapport PDF",
-            pdf,
-            f"rapport_{report_type}_{datetime.now().strftime('%Y%m%d')}.pdf",
-            "application/pdf"
-        )
+        # Rendu PDF en arrière-plan : la page reste utilisable pendant la génération
+        st.session_state.report_job_id = job_queue.submit('report_pdf', {
+            'report_type': report_type,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+        })
+    
+    job = job_queue.get(st.session_state.report_job_id) if st.session_state.get('report_job_id') else None
+    if job is not None:
+        if job.pending:
+            st.info("Rapport PDF en cours de génération...")
+            st.button("Actualiser")
+        elif job.done and os.path.exists(job.result_path):
+            with open(job.result_path, 'rb') as pdf:
+                st.download_button(
+                    "Télécharger le rapport PDF",
+                    pdf,
+                    f"rapport_{job.params['report_type']}_{datetime.now().strftime('%Y%m%d')}.pdf",
+                    "application/pdf"
+                )
+        elif job.status == 'failed':
+            st.error(f"La génération du rapport a échoué : {job.error}")
     
     # Affichage des statistiques
     st.subheader("Statistiques")
     
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Total présences", "150")
-    with col2:
-        st.metric("Activités réalisées", "12")
-    with col3:
-        st.metric("Messages envoyés", "45")
+    metric_cols = st.columns(len(report.metrics))
+    for col, (label, value) in zip(metric_cols, report.metrics.items()):
+        with col:
+            st.metric(label, value)
     
-    # Graphique exemple
-    chart_data = {
-        'dates': ['2024-01-15', '2024-01-16', '2024-01-17', '2024-01-18', '2024-01-19'],
-        'présences': [25, 30, 28, 32, 35]
-    }
+    st.line_chart(report.chart)
     
-    st.line_chart(chart_data)
+    for title, table in report.tables.items():
+        st.subheader(title)
+        if table.empty:
+            st.info("Aucune donnée sur la période")
+        else:
+            st.dataframe(table, hide_index=True, use_container_width=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -4,6 +4,8 @@ from models import User
 from models import Role
 from models import Permission
 from utils.validators import validator
+from utils.pagination import keyset_pages, PAGE_SIZE
+from utils.user_import import CSV_TEMPLATE, import_users, read_rows
 
 
 def check_admin():
@@ -32,28 +34,49 @@ def main():
 
     with tabs[0]:
         st.subheader("Utilisateurs existants")
-        users = User.get_all()
 
-        # Sélection multiple pour suppression en bloc
+        # Sélection multiple pour suppression en bloc : seuls les résultats de la
+        # recherche et les utilisateurs déjà sélectionnés sont chargés
+        delete_search = st.text_input("Rechercher les utilisateurs à supprimer", key="delete_user_search")
+        kept_users = st.session_state.get("users_to_delete", [])
+        found_users = User.search(delete_search, limit=50, detail='email') if delete_search else []
         selected_users = st.multiselect(
             "Sélectionner des utilisateurs à supprimer",
-            options=users,
-            format_func=lambda x: f"{x.name} ({x.email})",
-            key="users_to_delete"
+            options=list(dict.fromkeys(kept_users + found_users)),
+            default=kept_users,
+            format_func=lambda x: x.label
         )
+        st.session_state["users_to_delete"] = selected_users
+
+        if selected_users:
+            # Simulation : lignes qui seront supprimées ou modifiées, par table
+            impact, _ = User.bulk_delete([u.id for u in selected_users], dry_run=True)
+            st.warning("Êtes-vous sûr de vouloir supprimer ces utilisateurs ? Lignes concernées :")
+            st.dataframe(
+                [{"Table": table, "Lignes": count} for table, count in impact.items() if count],
+                hide_index=True
+            )
 
-        if selected_users and st.button("Supprimer les utilisateurs sélectionnés"):
-            if st.warning("Êtes-vous sûr de vouloir supprimer ces utilisateurs ?"):
-                deleted, errors = User.bulk_delete([u.id for u in selected_users])
+            if st.button("Supprimer les utilisateurs sélectionnés"):
+                counts, errors = User.bulk_delete([u.id for u in selected_users])
                 if errors:
                     st.error("\n".join(errors))
-                if deleted:
-                    st.success(f"{deleted} utilisateur(s) supprimé(s)")
+                if counts.get('users'):
+                    st.session_state["users_to_delete"] = []
+                    st.success(f"{counts['users']} utilisateur(s) supprimé(s)")
                     st.rerun()
 
         st.divider()
         st.subheader("Modifier un utilisateur")
 
+        # Recherche et pagination côté base : seule la page affichée est chargée
+        user_search = st.text_input("Rechercher (nom, prénom, email, grade)", key="admin_user_search")
+        users = keyset_pages(
+            "admin_users",
+            lambda after: User.page(after, PAGE_SIZE, search=user_search or None),
+            filters=user_search
+        )
+
         for user in users:
             with st.expander(f"{user.name} ({user.email})"):
                 with st.form(f"edit_user_{user.id}"):
@@ -137,35 +160,40 @@ def main():
     with tabs[1]:
         st.subheader("Import d'utilisateurs en bloc")
         st.markdown("""
-        Téléchargez un fichier CSV avec les colonnes suivantes:
+        Téléchargez un fichier CSV ou Excel (.xlsx) avec les colonnes suivantes:
         ```
-        email,nom,statut,mot_de_passe,roles
-        user@example.com,Nom Utilisateur,parent,password123,role1|role2
+        email,nom,prenom,grade,statut,mot_de_passe,roles,parents
         ```
-        Note: La colonne 'roles' est optionnelle. Utilisez | pour séparer plusieurs rôles.
+        Les colonnes 'prenom', 'grade', 'roles' et 'parents' sont optionnelles.
+        Utilisez | pour séparer plusieurs rôles ou plusieurs emails de parents ;
+        un parent peut être un compte existant ou une ligne du même fichier.
         """)
 
-        uploaded_file = st.file_uploader("Choisir un fichier CSV", type="csv")
-
-        if uploaded_file:
-            csv_data = uploaded_file.getvalue().decode('utf-8')
-            if st.button("Importer les utilisateurs"):
-                users, errors = User.bulk_create_from_csv(csv_data)
-                if errors:
-                    st.error("Erreurs lors de l'import:")
-                    for error in errors:
-                        st.error(error)
-                if users:
-                    st.success(f"{len(users)} utilisateur(s) importé(s) avec succès!")
-                    st.rerun()
-
-        # Template de fichier CSV
-        csv_template = """email,nom,statut,mot_de_passe,roles
-user@example.com,Nom Utilisateur,parent,password123,role1|role2"""
+        uploaded_file = st.file_uploader("Choisir un fichier", type=["csv", "xlsx"])
+
+        if uploaded_file and st.button("Importer les utilisateurs"):
+            try:
+                with st.spinner("Import en cours..."):
+                    report = import_users(read_rows(uploaded_file, uploaded_file.name))
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if report.created:
+                    st.success(
+                        f"{report.created} utilisateur(s) importé(s), "
+                        f"{report.links} association(s) parent-enfant créée(s)"
+                    )
+                if report.errors:
+                    st.error(f"{len(report.errors)} ligne(s) non importée(s):")
+                    st.dataframe(
+                        [{"Ligne": line, "Erreur": message} for line, message in report.errors],
+                        hide_index=True,
+                        use_container_width=True
+                    )
 
         st.download_button(
             "Télécharger le template CSV",
-            csv_template,
+            CSV_TEMPLATE,
             "template_utilisateurs.csv",
             "text/csv"
         )
@@ -224,9 +252,9 @@ user@example.com,Nom Utilisateur,parent,password123,role1|role2"""
     with tabs[3]:
         st.subheader("Association Parent-Enfant")
 
-        # Filtrer les parents et les enfants
-        parents = [u for u in users if u.status == "parent"]
-        children = [u for u in users if u.status in ["cadet", "AMC"]]
+        # Parents complets (pour les associations), enfants en liste légère
+        parents = User.get_all_by_status(["parent"])
+        children = User.get_summaries(["cadet", "AMC"], detail='email')
 
         with st.form("parent_child_association"):
             parent = st.selectbox(
@@ -239,14 +267,14 @@ user@example.com,Nom Utilisateur,parent,password123,role1|role2"""
             child = st.selectbox(
                 "Sélectionner un enfant",
                 children,
-                format_func=lambda x: f"{x.name} ({x.email})",
+                format_func=lambda x: x.label,
                 key="child_select"
             )
 
             if st.form_submit_button("Associer"):
                 if parent and child:
                     if parent.add_child(child.id):
-                        st.success(f"Association créée entre {parent.name} et {child.name}")
+                        st.success(f"Association créée entre {parent.name} et {child.label}")
                         st.rerun()
                     else:
                         st.error("Erreur lors de l'association")
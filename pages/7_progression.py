@@ -57,10 +57,11 @@ def main():
     tab1, tab2, tab3 = st.tabs(["Progression & Badges", "Notes & Appréciations", "Configuration Évaluations"])
 
     with tab1:
-        # Get user points and level
-        progress = user.get_points()
+        # Points, niveau et badges lus en une fois dans les statistiques matérialisées
+        progress = User.get_progress([user.id])[user.id]
         points = progress["points"]
         level = progress["level"]
+        badges = progress["badges"]
 
         # Display main stats in columns
         col1, col2, col3 = st.columns(3)
@@ -69,7 +70,6 @@ def main():
         with col2:
             st.metric("Points Total", points)
         with col3:
-            badges = user.get_badges()
             st.metric("Badges Gagnés", len(badges))
 
         # Show level progress chart
@@ -108,18 +108,37 @@ def main():
         else:
             st.info("Félicitations ! Vous avez débloqué tous les badges disponibles !")
 
+        # Classement des cadets et AMC
+        st.subheader("🏅 Classement")
+        leaderboard = User.get_leaderboard(limit=10, statuses=['cadet', 'AMC'])
+        if leaderboard:
+            st.dataframe(
+                [{
+                    "Rang": entry["rank"],
+                    "Nom": entry["name"],
+                    "Niveau": entry["level"],
+                    "Points": entry["points"]
+                } for entry in leaderboard],
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.info("Aucun cadet classé pour le moment")
+
     with tab2:
         if user.status in ['administration', 'animateur']:
             # Interface pour ajouter/modifier des notes
             st.subheader("Ajouter une note")
 
             # Sélection du cadet/AMC
-            cadets = User.get_all_by_status(['cadet', 'AMC'])
-            selected_cadet = st.selectbox(
+            cadets = User.get_summaries(['cadet', 'AMC'])
+            selected = st.selectbox(
                 "Sélectionner un cadet/AMC",
                 cadets,
-                format_func=lambda x: f"{x.name} ({x.status})"
+                format_func=lambda x: x.label
             )
+            # Charger l'utilisateur complet seulement pour le cadet choisi
+            selected_cadet = User.get_by_id(selected.id) if selected else None
 
             if selected_cadet:
                 with st.form("add_note"):
@@ -0,0 +1,108 @@
+import hashlib
+import io
+import os
+import tempfile
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow absent : les miniatures reprennent l'image originale
+    Image = None
+
+# Les fichiers sont rangés à côté de la base : /app/data dans Docker
+# (volume persistant), sinon le répertoire uploads/ du projet
+if os.path.exists('/app/data'):
+    BLOB_ROOT = '/app/data/uploads/blobs'
+else:
+    BLOB_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', 'blobs')
+
+BLOB_PREFIX = 'blob:'
+THUMBNAIL_SIZE = (300, 300)
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith(BLOB_PREFIX)
+
+
+class BlobStore:
+    """Stockage de fichiers adressé par contenu (SHA-256).
+
+    Un même contenu n'est écrit qu'une fois ; la base ne conserve que la
+    référence 'blob:<sha256>'. Les miniatures sont générées une seule fois,
+    à la première demande, puis relues depuis le disque.
+    """
+
+    def __init__(self, root=BLOB_ROOT):
+        self.root = root
+
+    def _path(self, digest, suffix=''):
+        return os.path.join(self.root, digest[:2], digest + suffix)
+
+    @staticmethod
+    def _digest(ref):
+        if not is_blob_ref(ref):
+            raise ValueError(f"Référence de fichier invalide: {ref!r}")
+        return ref[len(BLOB_PREFIX):]
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Écriture atomique : un lecteur ne voit jamais de fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, data: bytes) -> str:
+        """Enregistre le contenu s'il n'existe pas déjà et retourne sa référence"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            self._write(path, data)
+        return BLOB_PREFIX + digest
+
+    def path(self, ref) -> str:
+        return self._path(self._digest(ref))
+
+    def get(self, ref) -> bytes:
+        with open(self.path(ref), 'rb') as blob_file:
+            return blob_file.read()
+
+    def exists(self, ref) -> bool:
+        return is_blob_ref(ref) and os.path.exists(self.path(ref))
+
+    def thumbnail(self, ref, size=THUMBNAIL_SIZE) -> str:
+        """Chemin d'une miniature de l'image, créée à la première demande"""
+        digest = self._digest(ref)
+        path = self._path(digest, f'_{size[0]}x{size[1]}.png')
+        if os.path.exists(path):
+            return path
+
+        original = self._path(digest)
+        if Image is None:
+            return original
+        try:
+            with Image.open(original) as image:
+                image.thumbnail(size)
+                buffer = io.BytesIO()
+                image.save(buffer, format='PNG')
+        except OSError:
+            # Contenu qui n'est pas une image lisible : on sert l'original
+            return original
+        self._write(path, buffer.getvalue())
+        return path
+
+
+photo_store = BlobStore()
+
+
+def resolve_image(photo_url, thumbnail=True):
+    """Source utilisable par st.image : URL inchangée ou chemin du fichier stocké"""
+    if not is_blob_ref(photo_url):
+        return photo_url
+    if not photo_store.exists(photo_url):
+        return None
+    return photo_store.thumbnail(photo_url) if thumbnail else photo_store.path(photo_url)
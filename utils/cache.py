@@ -0,0 +1,122 @@
+import copy
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import database
+
+# Durée de vie par défaut d'une entrée, en secondes. Elle borne la péremption
+# quand la base est modifiée par un autre processus (les compteurs de
+# génération ne sont visibles que dans le processus courant).
+READ_CACHE_TTL = float(os.environ.get('READ_CACHE_TTL', 300))
+# Nombre maximum d'entrées ; au-delà, les moins récemment lues sont évincées
+READ_CACHE_MAX_ENTRIES = int(os.environ.get('READ_CACHE_MAX_ENTRIES', 256))
+
+
+class ReadModelCache:
+    """Cache des données de référence partagé par toutes les sessions Streamlit.
+
+    Chaque entrée est associée aux tables dont elle dépend : elle est servie
+    tant que sa durée de vie n'est pas écoulée et que la génération de ces
+    tables (database.bump_generation) n'a pas changé. Le cache est borné à
+    max_entries entrées (LRU) et chaque insertion écarte les entrées périmées
+    ou obsolètes, qui sans cela resteraient en mémoire tant que leur clé
+    n'est pas relue.
+    """
+
+    def __init__(self, default_ttl=READ_CACHE_TTL, max_entries=READ_CACHE_MAX_ENTRIES):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, tables, loader, ttl=None):
+        # La génération est lue avant le chargement : une écriture concurrente
+        # rendra l'entrée obsolète au prochain appel
+        generation = database.generation(*tables)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == generation and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+            self.misses += 1
+
+        value = loader()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (tuple(tables), generation, expires_at, value)
+            self._entries.move_to_end(key)
+            self._evict(now)
+        return value
+
+    def _evict(self, now):
+        """Retire les entrées périmées ou obsolètes, puis les plus anciennes au-delà de la limite"""
+        stale = [
+            key for key, (tables, generation, expires_at, _) in self._entries.items()
+            if expires_at <= now or database.generation(*tables) != generation
+        ]
+        for key in stale:
+            del self._entries[key]
+        self.evictions += len(stale)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *tables):
+        """Invalide toutes les entrées dépendant des tables données"""
+        database.bump_generation(*tables)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+            }
+
+
+read_models = ReadModelCache()
+
+
+def load_copy(key, tables, loader, ttl=None):
+    """Comme read_models.get_or_load, mais retourne une copie propre à l'appelant.
+
+    Le cache conserve la valeur chargée (une liste y est figée en tuple) et
+    ne la remet jamais telle quelle : chaque appel reçoit sa propre copie,
+    qu'une session peut modifier sans toucher au cache ni aux autres sessions.
+    """
+    value = read_models.get_or_load(key, tables, lambda: _freeze(loader()), ttl)
+    return list(copy.deepcopy(value)) if isinstance(value, tuple) else copy.deepcopy(value)
+
+
+def cached_read_model(*tables, ttl=None):
+    """Décorateur pour les méthodes de lecture des modèles de référence.
+
+    La clé inclut les arguments de l'appel ; les valeurs sont servies par
+    load_copy(), chaque appel reçoit donc sa propre copie des objets.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            return load_copy(key, tables, lambda: func(*args, **kwargs), ttl)
+        return wrapper
+    return decorator
+
+
+def _freeze(value):
+    return tuple(value) if isinstance(value, list) else value
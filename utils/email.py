@@ -1,34 +1,33 @@
 from flask import current_app, url_for
-from flask_mail import Message
-from app import mail
+from utils.email_templates import render_email, render_emails
+from utils.outbox import enqueue, enqueue_many
 import logging
 
 def send_email(subject, recipient, html_body, attachments=None):
     """
-    Send an email with the given subject and body to the recipient.
+    Queue an email with the given subject and body for the recipient.
+    
+    The message is stored in the outbox table and sent in the background by
+    utils.outbox.mail_sender; the request does not wait for the SMTP server.
     
     Args:
         subject (str): Email subject
-        recipient (str): Email recipient
+        recipient (str or list): Email recipient, or several recipients
         html_body (str): HTML content of the email
         attachments (list, optional): List of attachment tuples (filename, content_type, data)
     """
+    recipients = [recipient] if isinstance(recipient, str) else list(recipient)
     try:
-        msg = Message(
+        enqueue(
             subject,
-            recipients=[recipient],
-            html=html_body,
-            sender=current_app.config['MAIL_DEFAULT_SENDER']
+            recipients,
+            html_body,
+            sender=current_app.config['MAIL_DEFAULT_SENDER'],
+            attachments=attachments
         )
-        
-        if attachments:
-            for attachment in attachments:
-                msg.attach(*attachment)
-        
-        mail.send(msg)
         return True
     except Exception as e:
-        logging.error(f"Failed to send email to {recipient}: {str(e)}")
+        logging.error(f"Failed to queue email to {', '.join(recipients)}: {str(e)}")
         return False
 
 def send_candidate_registration_email(candidate, document, signing_token):
@@ -49,26 +48,12 @@ def send_candidate_registration_email(candidate, document, signing_token):
         _external=True
     )
     
-    html_body = f"""
-    <h2>Bienvenue à l'Académie des Cadets de la Défense</h2>
-    <p>Cher(e) {candidate.first_name} {candidate.last_name},</p>
-    <p>Nous vous remercions de votre inscription. Pour finaliser votre candidature, 
-    veuillez signer électroniquement les documents nécessaires.</p>
-    
-    <p><strong>Document à signer:</strong> {document.document_type_display}</p>
-    
-    <p>Pour signer ce document, veuillez cliquer sur le lien ci-dessous:</p>
-    <p><a href="{signing_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Signer le Document</a></p>
-    
-    <p>Ce lien est valable pendant 30 jours.</p>
-    
-    <p>Si vous avez des questions, n'hésitez pas à nous contacter.</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "candidate_registration.html",
+        candidate=candidate,
+        document=document,
+        signing_url=signing_url
+    )
     
     return send_email(subject, candidate.email, html_body)
 
@@ -92,28 +77,13 @@ def send_guardian_signing_email(guardian, document, signing_token):
     
     candidate = document.application.candidate
     
-    html_body = f"""
-    <h2>Demande de Signature de Document</h2>
-    <p>Cher(e) {guardian.first_name} {guardian.last_name},</p>
-    
-    <p>Vous recevez cet email car {candidate.first_name} {candidate.last_name} 
-    est en cours d'inscription à l'Académie des Cadets de la Défense et a besoin de votre
-    signature en tant que tuteur(trice) légal(e).</p>
-    
-    <p><strong>Document à signer:</strong> {document.document_type_display}</p>
-    
-    <p>Pour signer ce document, veuillez cliquer sur le lien ci-dessous:</p>
-    <p><a href="{signing_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Signer le Document</a></p>
-    
-    <p>Ce lien est valable pendant 30 jours.</p>
-    
-    <p>Si vous avez des questions, n'hésitez pas à nous contacter.</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "guardian_signing.html",
+        guardian=guardian,
+        candidate=candidate,
+        document=document,
+        signing_url=signing_url
+    )
     
     return send_email(subject, guardian.email, html_body)
 
@@ -128,23 +98,11 @@ def request_additional_documents(candidate):
     
     login_url = url_for('auth.login', _external=True)
     
-    html_body = f"""
-    <h2>Documents supplémentaires requis</h2>
-    <p>Cher(e) {candidate.first_name} {candidate.last_name},</p>
-    
-    <p>Nous avons bien reçu votre inscription à l'Académie des Cadets de la Défense. 
-    Cependant, nous avons besoin de documents supplémentaires pour compléter votre dossier.</p>
-    
-    <p>Veuillez vous connecter à votre compte pour voir quels documents sont manquants:</p>
-    <p><a href="{login_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Se connecter</a></p>
-    
-    <p>Si vous avez des questions, n'hésitez pas à nous contacter.</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "additional_documents_request.html",
+        candidate=candidate,
+        login_url=login_url
+    )
     
     return send_email(subject, candidate.email, html_body)
 
@@ -167,26 +125,14 @@ def notify_admin_document_upload(application):
     
     admin_url = url_for('admin.application_detail', application_id=application.id, _external=True)
     
-    html_body = f"""
-    <h2>Nouveau document téléversé</h2>
-    <p>Le candidat {candidate.first_name} {candidate.last_name} a téléversé un nouveau document.</p>
-    
-    <p>Pour examiner ce document, cliquez sur le lien ci-dessous:</p>
-    <p><a href="{admin_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Voir le Dossier</a></p>
-    
-    <p>Cordialement,<br>
-    Le système de l'Académie des Cadets de la Défense</p>
-    """
-    
-    # Envoyer à tous les administrateurs
-    success = True
-    for admin in admins:
-        if not send_email(subject, admin.email, html_body):
-            success = False
+    html_body = render_email(
+        "admin_document_upload.html",
+        candidate=candidate,
+        admin_url=admin_url
+    )
     
-    return success
+    # Un seul passage par la file d'envoi pour tous les administrateurs
+    return send_email(subject, [admin.email for admin in admins], html_body)
 
 def send_approval_email(candidate, candidate_password, guardian_accounts):
     """
@@ -201,42 +147,49 @@ def send_approval_email(candidate, candidate_password, guardian_accounts):
     
     login_url = url_for('auth.login', _external=True)
     
-    guardian_html = ""
-    for account in guardian_accounts:
-        guardian = account['guardian']
-        password = account['password']
-        guardian_html += f"""
-        <h3>Compte Tuteur: {guardian.first_name} {guardian.last_name}</h3>
-        <p><strong>Identifiant:</strong> {guardian.email}<br>
-        <strong>Mot de passe:</strong> {password}</p>
-        """
-    
-    html_body = f"""
-    <h2>Félicitations - Votre candidature a été approuvée!</h2>
-    <p>Cher(e) {candidate.first_name} {candidate.last_name},</p>
-    
-    <p>Nous sommes heureux de vous informer que votre candidature à l'Académie des Cadets de la Défense a été approuvée.</p>
-    
-    <p>Vos identifiants pour accéder à la plateforme sont:</p>
-    <p><strong>Identifiant:</strong> {candidate.email}<br>
-    <strong>Mot de passe:</strong> {candidate_password}</p>
-    
-    <p>Des comptes ont également été créés pour vos tuteurs légaux:</p>
-    {guardian_html}
-    
-    <p>Pour vous connecter, cliquez sur le lien suivant:</p>
-    <p><a href="{login_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Se connecter</a></p>
-    
-    <p>Bienvenue à l'Académie des Cadets de la Défense!</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "approval.html",
+        candidate=candidate,
+        candidate_password=candidate_password,
+        guardian_accounts=guardian_accounts,
+        login_url=login_url
+    )
     
     return send_email(subject, candidate.email, html_body)
 
+def send_approval_emails(approvals):
+    """
+    Send approval emails for a whole batch of candidates (e.g. a promotion).
+
+    The template is resolved once and every email is queued in a single
+    outbox transaction.
+
+    Args:
+        approvals: Iterable of (candidate, candidate_password, guardian_accounts) tuples
+    """
+    subject = "Félicitations - Votre candidature a été approuvée"
+
+    approvals = list(approvals)
+    contexts = (
+        {
+            'candidate': candidate,
+            'candidate_password': candidate_password,
+            'guardian_accounts': guardian_accounts
+        }
+        for candidate, candidate_password, guardian_accounts in approvals
+    )
+    bodies = render_emails("approval.html", contexts, login_url=url_for('auth.login', _external=True))
+
+    try:
+        enqueue_many(
+            ((subject, candidate.email, html_body) for (candidate, _, _), html_body in zip(approvals, bodies)),
+            sender=current_app.config['MAIL_DEFAULT_SENDER']
+        )
+        return True
+    except Exception as e:
+        logging.error(f"Failed to queue approval emails: {str(e)}")
+        return False
+
 def send_rejection_email(candidate, rejection_reason):
     """
     Send rejection email to candidate.
@@ -247,21 +200,11 @@ def send_rejection_email(candidate, rejection_reason):
     """
     subject = "Réponse à votre candidature - Académie des Cadets de la Défense"
     
-    html_body = f"""
-    <h2>Réponse à votre candidature</h2>
-    <p>Cher(e) {candidate.first_name} {candidate.last_name},</p>
-    
-    <p>Nous vous remercions d'avoir postulé à l'Académie des Cadets de la Défense.</p>
-    
-    <p>Après examen attentif de votre dossier, nous sommes au regret de vous informer que votre candidature n'a pas été retenue.</p>
-    
-    <p><strong>Motif:</strong> {rejection_reason}</p>
-    
-    <p>Nous vous encourageons à postuler à nouveau lors d'une prochaine session si vous le souhaitez.</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "rejection.html",
+        candidate=candidate,
+        rejection_reason=rejection_reason
+    )
     
     return send_email(subject, candidate.email, html_body)
 
@@ -292,24 +235,12 @@ def send_document_signing_request(user, document, signing_process):
         # Ni l'un ni l'autre, envoyer un email générique
         signing_url = url_for('registration.sign_document_with_token', token=signing_process.signing_token, _external=True)
         
-        html_body = f"""
-        <h2>Document à signer</h2>
-        <p>Bonjour {user.username},</p>
-        
-        <p>Un document requiert votre signature électronique pour l'Académie des Cadets de la Défense.</p>
-        
-        <p><strong>Document:</strong> {document.document_type_display}</p>
-        
-        <p>Pour signer ce document, veuillez cliquer sur le lien ci-dessous:</p>
-        <p><a href="{signing_url}" style="display: inline-block; padding: 10px 20px; 
-        background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-        Signer le Document</a></p>
-        
-        <p>Ce lien est valable pendant 30 jours.</p>
-        
-        <p>Cordialement,<br>
-        L'équipe de l'Académie des Cadets de la Défense</p>
-        """
+        html_body = render_email(
+            "document_signing.html",
+            user=user,
+            document=document,
+            signing_url=signing_url
+        )
         
         return send_email(subject, user.email, html_body)
 
@@ -342,28 +273,15 @@ def send_step_completion_email(candidate, step_completed, next_step):
         _external=True
     )
     
-    html_body = f"""
-    <h2>Félicitations pour votre progression !</h2>
-    <p>Cher(e) {candidate.first_name} {candidate.last_name},</p>
-    
-    <p>Nous sommes heureux de vous informer que vous avez complété avec succès 
-    l'étape {step_completed} de votre candidature : <strong>{step_descriptions.get(step_completed)}</strong>.</p>
-    
-    <p>Votre candidature avance bien. La prochaine étape concerne : <strong>{step_descriptions.get(next_step)}</strong>.</p>
-    
-    <p>Pour continuer votre candidature, cliquez sur le lien ci-dessous :</p>
-    <p><a href="{next_step_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Continuer à l'étape {next_step}</a></p>
-    
-    <p>Vous pouvez également vous reconnecter ultérieurement pour reprendre votre candidature 
-    là où vous l'avez laissée.</p>
-    
-    <p>Si vous avez des questions, n'hésitez pas à nous contacter.</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "step_completion.html",
+        candidate=candidate,
+        step_completed=step_completed,
+        step_completed_description=step_descriptions.get(step_completed),
+        next_step=next_step,
+        next_step_description=step_descriptions.get(next_step),
+        next_step_url=next_step_url
+    )
     
     return send_email(subject, candidate.email, html_body)
 
@@ -380,26 +298,11 @@ def notify_all_steps_completed(candidate):
     # URL pour se connecter et voir le statut
     login_url = url_for('auth.login', _external=True)
     
-    html_body = f"""
-    <h2>Candidature complétée avec succès !</h2>
-    <p>Cher(e) {candidate.first_name} {candidate.last_name},</p>
-    
-    <p>Toutes nos félicitations ! Vous avez complété avec succès toutes les étapes de votre candidature
-    pour l'Académie des Cadets de la Défense.</p>
-    
-    <p>Votre dossier est maintenant <strong>en attente d'examen</strong> par notre équipe. Nous examinerons
-    attentivement votre candidature et vous informerons de notre décision dans les meilleurs délais.</p>
-    
-    <p>Vous pouvez consulter le statut de votre candidature à tout moment en vous connectant à votre compte :</p>
-    <p><a href="{login_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Se connecter</a></p>
-    
-    <p>Nous vous remercions pour l'intérêt que vous portez à l'Académie des Cadets de la Défense.</p>
-    
-    <p>Cordialement,<br>
-    L'équipe de l'Académie des Cadets de la Défense</p>
-    """
+    html_body = render_email(
+        "all_steps_completed.html",
+        candidate=candidate,
+        login_url=login_url
+    )
     
     # Notifier également les administrateurs
     notify_admin_new_complete_application(candidate)
@@ -430,29 +333,11 @@ def notify_admin_new_complete_application(candidate):
     # URL pour examiner la candidature
     admin_url = url_for('admin.application_detail', application_id=application.id, _external=True)
     
-    html_body = f"""
-    <h2>Nouvelle candidature complète à examiner</h2>
-    <p>Bonjour,</p>
-    
-    <p>Une nouvelle candidature a été complétée et est prête à être examinée.</p>
-    
-    <p><strong>Candidat :</strong> {candidate.first_name} {candidate.last_name}<br>
-    <strong>Email :</strong> {candidate.email}<br>
-    <strong>Date de naissance :</strong> {candidate.date_of_birth.strftime('%d/%m/%Y')}</p>
-    
-    <p>Pour examiner cette candidature, cliquez sur le lien ci-dessous :</p>
-    <p><a href="{admin_url}" style="display: inline-block; padding: 10px 20px; 
-    background-color: #4CAF50; color: white; text-decoration: none; border-radius: 4px;">
-    Examiner la candidature</a></p>
-    
-    <p>Cordialement,<br>
-    Le système de l'Académie des Cadets de la Défense</p>
-    """
-    
-    # Envoyer à tous les administrateurs
-    success = True
-    for admin in admins:
-        if not send_email(subject, admin.email, html_body):
-            success = False
+    html_body = render_email(
+        "admin_complete_application.html",
+        candidate=candidate,
+        admin_url=admin_url
+    )
     
-    return success
\ No newline at end of file
+    # Un seul passage par la file d'envoi pour tous les administrateurs
+    return send_email(subject, [admin.email for admin in admins], html_body)
\ No newline at end of file
@@ -0,0 +1,55 @@
+import os
+from typing import Iterable, Iterator
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+EMAIL_TEMPLATES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'email'
+)
+# Blocs sans variable (signatures, mentions communes) : rendus une seule fois
+STATIC_PARTIALS_PREFIX = 'partials/'
+
+
+def _build_environment() -> Environment:
+    """Environnement Jinja des emails, tous les gabarits compilés au chargement.
+
+    auto_reload est désactivé : les gabarits compilés restent en cache sans
+    vérification du fichier source à chaque rendu. Les blocs statiques de
+    partials/ sont rendus une fois et injectés tels quels dans chaque email
+    via la variable globale `static`.
+    """
+    env = Environment(
+        loader=FileSystemLoader(EMAIL_TEMPLATES_DIR),
+        autoescape=select_autoescape(['html']),
+        auto_reload=False,
+        cache_size=-1,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    env.globals['static'] = {
+        os.path.splitext(name[len(STATIC_PARTIALS_PREFIX):])[0]: Markup(env.get_template(name).render().strip())
+        for name in env.list_templates(filter_func=lambda name: name.startswith(STATIC_PARTIALS_PREFIX))
+    }
+    for name in env.list_templates(extensions=['html']):
+        env.get_template(name)
+    return env
+
+
+email_env = _build_environment()
+
+
+def render_email(template_name: str, **context) -> str:
+    """Rend un email à partir d'un gabarit de templates/email"""
+    return email_env.get_template(template_name).render(**context)
+
+
+def render_emails(template_name: str, contexts: Iterable[dict], **shared) -> Iterator[str]:
+    """Rend un même gabarit pour une série de destinataires.
+
+    shared contient le contexte commun à tous les emails (URL de connexion,
+    etc.), chaque élément de contexts le contexte propre au destinataire.
+    """
+    template = email_env.get_template(template_name)
+    for context in contexts:
+        yield template.render(shared, **context)
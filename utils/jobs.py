@@ -0,0 +1,291 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Optional
+
+import database
+
+# Les résultats sont rangés à côté de la base : /app/data dans Docker
+# (volume persistant), sinon le répertoire uploads/ du projet
+if os.path.exists('/app/data'):
+    JOB_RESULTS_DIR = '/app/data/uploads/jobs'
+else:
+    JOB_RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads', 'jobs')
+
+# Nombre de processus de rendu et durée de conservation des résultats (secondes)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+# Intervalle maximal entre deux recherches de travaux en attente (secondes)
+JOB_POLL_INTERVAL = 5.0
+# Au-delà de cette durée (secondes), un travail 'running' est considéré comme
+# abandonné par un processus arrêté et remis en file
+JOB_STALE_CLAIM = int(os.environ.get('JOB_STALE_CLAIM', 1800))
+
+
+def render_report_pdf(params, output_path):
+    """Calcule un rapport et l'écrit en PDF (exécuté dans un processus de rendu)"""
+    from utils.pdf import PDFGenerator
+    from utils.reports import build_report
+
+    report = build_report(
+        params['report_type'],
+        date.fromisoformat(params['start_date']),
+        date.fromisoformat(params['end_date'])
+    )
+    PDFGenerator.write_pdf_report(report.pdf_blocks(), params['report_type'], output_path)
+
+
+# Types de travaux : fonctions de module (sérialisables vers les processus),
+# appelées avec (params, chemin du fichier résultat)
+JOB_HANDLERS = {
+    'report_pdf': render_report_pdf,
+}
+
+
+def _run_job(db_path, kind, params, output_path):
+    """Point d'entrée dans le processus de rendu"""
+    database.DB_PATH = db_path
+    JOB_HANDLERS[kind](params, output_path)
+    return output_path
+
+
+class Job:
+    def __init__(self, id: int, kind: str, params: str, status: str, result_path: Optional[str],
+                 error: Optional[str], created_at, finished_at, expires_at):
+        self.id = id
+        self.kind = kind
+        self.params = json.loads(params)
+        self.status = status
+        self.result_path = result_path
+        self.error = error
+        self.created_at = created_at
+        self.finished_at = finished_at
+        self.expires_at = expires_at
+
+    @property
+    def pending(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    @property
+    def done(self) -> bool:
+        return self.status == 'done'
+
+
+class JobQueue:
+    """File de travaux persistée dans la table jobs et exécutée par un pool de processus.
+
+    submit() enregistre la demande et retourne immédiatement l'identifiant
+    du travail ; une demande identique (même type, mêmes paramètres) encore
+    en cours ou dont le résultat n'a pas expiré réutilise le travail
+    existant. Un thread de répartition réserve les travaux en attente et les
+    confie au pool ; l'appelant suit l'avancement avec get().
+    """
+
+    def __init__(self, workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL, results_dir=JOB_RESULTS_DIR):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.results_dir = results_dir
+        self._executor = None
+        self._dispatcher = None
+        self._slots = threading.BoundedSemaphore(workers)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _dedup_key(kind, params):
+        payload = json.dumps([kind, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def submit(self, kind: str, params: dict) -> int:
+        """Met un travail en file (ou retrouve son équivalent) et retourne son identifiant"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Type de travail inconnu: {kind}")
+        dedup_key = self._dedup_key(kind, params)
+        # Démarré avant la déduplication : un travail retrouvé (laissé en file
+        # par un processus redémarré) doit lui aussi avoir un répartiteur
+        self.start()
+
+        # Recherche et insertion sous le verrou d'écriture : deux demandes
+        # identiques simultanées ne créent qu'un seul travail
+        with database.immediate_transaction() as cur:
+            cur.execute("""
+                SELECT id
+                FROM jobs
+                WHERE dedup_key = %s
+                AND (status IN ('queued', 'running')
+                     OR (status = 'done' AND expires_at > CURRENT_TIMESTAMP))
+                ORDER BY id DESC
+                LIMIT 1
+            """, (dedup_key,))
+            existing = cur.fetchone()
+            if existing is not None:
+                return existing['id']
+
+            cur.execute("""
+                INSERT INTO jobs (kind, params, dedup_key)
+                VALUES (%s, %s, %s)
+                RETURNING id
+            """, (kind, json.dumps(params, sort_keys=True, default=str), dedup_key))
+            job_id = cur.fetchone()[0]
+
+        self._wakeup.set()
+        return job_id
+
+    @staticmethod
+    def get(job_id: int) -> Optional[Job]:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, kind, params, status, result_path, error, created_at, finished_at, expires_at
+                FROM jobs
+                WHERE id = %s
+            """, (job_id,))
+            if (data := cur.fetchone()) is not None:
+                return Job(*data)
+            return None
+        finally:
+            cur.close()
+            conn.close()
+
+    def start(self):
+        """Démarre le pool et le thread de répartition (une seule fois par processus)"""
+        with self._lock:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            os.makedirs(self.results_dir, exist_ok=True)
+            if self._executor is None:
+                # spawn : le processus Streamlit a déjà des threads, fork n'est pas sûr
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        while True:
+            # Le créneau n'est rendu par _on_done qu'une fois le travail confié au pool ;
+            # toute erreur avant ce point le rend ici, puis la boucle reprend
+            holding_slot = False
+            try:
+                self.purge_expired()
+                self._slots.acquire()
+                holding_slot = True
+                # Effacé avant la recherche : un submit() concurrent n'est jamais manqué
+                self._wakeup.clear()
+                job = self._claim()
+                if job is None:
+                    holding_slot = False
+                    self._slots.release()
+                    self._wakeup.wait(JOB_POLL_INTERVAL)
+                    continue
+
+                job_id, kind, params = job
+                output_path = os.path.join(self.results_dir, f"{kind}_{job_id}_{uuid.uuid4().hex}.pdf")
+                try:
+                    future = self._executor.submit(_run_job, database.DB_PATH, kind, params, output_path)
+                except Exception as e:
+                    self._finish(job_id, error=str(e))
+                    raise
+                holding_slot = False
+                future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+            except Exception as e:
+                if holding_slot:
+                    self._slots.release()
+                logging.error(f"Erreur de la file de travaux: {str(e)}")
+                self._wakeup.wait(JOB_POLL_INTERVAL)
+
+    def _claim(self):
+        """Réserve le plus ancien travail en attente ; None s'il n'y en a pas"""
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            # Travaux d'un processus arrêté en cours de rendu
+            cur.execute("""
+                UPDATE jobs SET status = 'queued', started_at = NULL
+                WHERE status = 'running' AND started_at <= datetime('now', %s)
+            """, (f'-{JOB_STALE_CLAIM} seconds',))
+            conn.commit()
+            cur.execute("""
+                SELECT id, kind, params
+                FROM jobs
+                WHERE status = 'queued'
+                ORDER BY id
+                LIMIT 1
+            """)
+            row = cur.fetchone()
+            if row is None:
+                return None
+            # Mise à jour conditionnelle : un autre processus a pu le réserver entre-temps
+            cur.execute("""
+                UPDATE jobs
+                SET status = 'running', started_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'queued'
+            """, (row['id'],))
+            conn.commit()
+            if cur.rowcount != 1:
+                return None
+            return row['id'], row['kind'], json.loads(row['params'])
+        finally:
+            cur.close()
+            conn.close()
+
+    def _on_done(self, job_id, future):
+        try:
+            error = future.exception()
+            if error is None:
+                self._finish(job_id, result_path=future.result())
+            else:
+                logging.error(f"Échec du travail {job_id}: {error}")
+                self._finish(job_id, error=str(error))
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def _finish(self, job_id, result_path=None, error=None):
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE jobs
+                SET status = %s, result_path = %s, error = %s,
+                    finished_at = CURRENT_TIMESTAMP,
+                    expires_at = datetime('now', %s)
+                WHERE id = %s
+            """, ('failed' if error else 'done', result_path, error,
+                  f'+{self.result_ttl} seconds', job_id))
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    def purge_expired(self) -> int:
+        """Supprime les travaux terminés expirés et leurs fichiers résultats"""
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, result_path
+                FROM jobs
+                WHERE status IN ('done', 'failed') AND expires_at <= CURRENT_TIMESTAMP
+            """)
+            expired = cur.fetchall()
+            for row in expired:
+                if row['result_path'] and os.path.exists(row['result_path']):
+                    os.remove(row['result_path'])
+            if expired:
+                cur.executemany("DELETE FROM jobs WHERE id = %s", [(row['id'],) for row in expired])
+                conn.commit()
+            return len(expired)
+        finally:
+            cur.close()
+            conn.close()
+
+
+job_queue = JobQueue()
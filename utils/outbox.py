@@ -0,0 +1,276 @@
+import base64
+import json
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from email.message import EmailMessage
+from typing import Iterable, List, Optional, Tuple
+
+import database
+from config import Config
+
+# Délai maximal entre deux recherches de messages à envoyer (secondes)
+OUTBOX_POLL_INTERVAL = 10.0
+# Un message resté 'sending' plus longtemps vient d'un expéditeur interrompu
+OUTBOX_STALE_CLAIM = 600
+
+
+def _domain(address):
+    return address.rsplit('@', 1)[-1].lower()
+
+
+def enqueue(subject: str, recipients: Iterable[str], html_body: str, sender: str,
+            attachments: Optional[List[tuple]] = None) -> List[int]:
+    """Ajoute un message par destinataire dans la file d'envoi et retourne leurs identifiants.
+
+    attachments : liste de tuples (filename, content_type, data) comme pour
+    flask_mail.Message.attach ; le contenu est conservé en base64.
+    """
+    return enqueue_many(((subject, recipient, html_body) for recipient in recipients),
+                        sender, attachments)
+
+
+def enqueue_many(messages: Iterable[Tuple[str, str, str]], sender: str,
+                 attachments: Optional[List[tuple]] = None) -> List[int]:
+    """Ajoute en une transaction des messages (subject, recipient, html_body) distincts"""
+    rows = [(sender, recipient, _domain(recipient), subject, html_body)
+            for subject, recipient, html_body in messages if recipient]
+    if not rows:
+        return []
+    encoded = json.dumps([
+        [filename, content_type, base64.b64encode(data).decode('ascii')]
+        for filename, content_type, data in attachments
+    ]) if attachments else None
+
+    # Verrou d'écriture pris avant la lecture de MAX(id) : aucun autre
+    # processus ne peut insérer entre-temps, les ids relus sont les nôtres
+    with database.immediate_transaction() as cur:
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM outbox")
+        last_id = cur.fetchone()[0]
+        cur.executemany("""
+            INSERT INTO outbox (sender, recipient, domain, subject, html_body, attachments)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [row + (encoded,) for row in rows])
+        cur.execute("SELECT id FROM outbox WHERE id > %s ORDER BY id", (last_id,))
+        ids = [row[0] for row in cur.fetchall()]
+
+    mail_sender.start()
+    mail_sender.wake()
+    return ids
+
+
+class DomainRateLimiter:
+    """Fenêtre glissante d'une minute : au plus `limit` envois par domaine destinataire"""
+
+    def __init__(self, limit, window=60.0):
+        self.limit = limit
+        self.window = window
+        self._sent = defaultdict(deque)
+
+    def delay(self, domain, now=None) -> float:
+        """0 si un envoi vers le domaine est possible, sinon l'attente en secondes"""
+        now = time.monotonic() if now is None else now
+        sent = self._sent[domain]
+        while sent and sent[0] <= now - self.window:
+            sent.popleft()
+        if len(sent) < self.limit:
+            return 0.0
+        return sent[0] + self.window - now
+
+    def record(self, domain, now=None):
+        self._sent[domain].append(time.monotonic() if now is None else now)
+
+
+class MailSender:
+    """Expéditeur en arrière-plan de la table outbox.
+
+    Les messages dus sont réservés par lots (une seule instruction UPDATE,
+    sûre entre processus) et envoyés sur une même connexion SMTP, gardée
+    ouverte tant que la file n'est pas vide. Un échec replanifie le message
+    avec un délai doublé à chaque tentative ; un domaine qui a atteint sa
+    limite d'envois voit ses messages reportés sans compter de tentative.
+    Serveur et port sont paramétrables pour pointer vers un serveur SMTP
+    local (aiosmtpd) en test.
+    """
+
+    def __init__(self, host=Config.MAIL_SERVER, port=Config.MAIL_PORT, use_tls=Config.MAIL_USE_TLS,
+                 username=Config.MAIL_USERNAME, password=Config.MAIL_PASSWORD,
+                 batch_size=Config.MAIL_BATCH_SIZE, max_attempts=Config.MAIL_MAX_ATTEMPTS,
+                 retry_delay=Config.MAIL_RETRY_DELAY, domain_rate_limit=Config.MAIL_DOMAIN_RATE_LIMIT):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.limiter = DomainRateLimiter(domain_rate_limit)
+        self._smtp = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def start(self):
+        """Démarre le thread d'envoi (une seule fois par processus)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                sent = self.send_pending()
+            except Exception as e:
+                logging.error(f"Erreur de l'expéditeur d'emails: {str(e)}")
+                sent = 0
+            if not sent:
+                self._disconnect()
+                self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+
+    def _connect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+                return self._smtp
+            except smtplib.SMTPException:
+                self._disconnect()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _claim(self):
+        """Réserve un lot de messages dus ; retourne les lignes réservées"""
+        claim = uuid.uuid4().hex
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            # Messages d'un expéditeur interrompu en cours d'envoi
+            cur.execute("""
+                UPDATE outbox SET status = 'queued', claim = NULL
+                WHERE status = 'sending' AND next_attempt_at <= datetime('now', %s)
+            """, (f'-{OUTBOX_STALE_CLAIM} seconds',))
+            cur.execute("""
+                UPDATE outbox
+                SET status = 'sending', claim = %s, next_attempt_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE status = 'queued' AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                )
+            """, (claim, self.batch_size))
+            conn.commit()
+            cur.execute("""
+                SELECT id, sender, recipient, domain, subject, html_body, attachments, attempts
+                FROM outbox
+                WHERE claim = %s
+                ORDER BY id
+            """, (claim,))
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    @staticmethod
+    def _build_message(row):
+        msg = EmailMessage()
+        msg['Subject'] = row['subject']
+        msg['From'] = row['sender']
+        msg['To'] = row['recipient']
+        msg.set_content("Ce message est au format HTML.")
+        msg.add_alternative(row['html_body'], subtype='html')
+        for filename, content_type, data in json.loads(row['attachments'] or '[]'):
+            maintype, _, subtype = content_type.partition('/')
+            msg.add_attachment(base64.b64decode(data), maintype=maintype,
+                               subtype=subtype or 'octet-stream', filename=filename)
+        return msg
+
+    def send_pending(self) -> int:
+        """Envoie un lot de messages dus ; retourne le nombre de messages traités"""
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        sent, deferred, failures = [], [], []
+        for index, row in enumerate(rows):
+            wait = self.limiter.delay(row['domain'])
+            if wait > 0:
+                deferred.append((f'+{int(wait) + 1} seconds', row['id']))
+                continue
+            try:
+                self._connect().send_message(self._build_message(row))
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as e:
+                # Connexion perdue : le reste du lot est replanifié avec ce message
+                self._disconnect()
+                failures.extend((r, str(e)) for r in rows[index:])
+                break
+            except smtplib.SMTPException as e:
+                failures.append((row, str(e)))
+                continue
+            self.limiter.record(row['domain'])
+            sent.append((row['id'],))
+
+        self._record(sent, deferred, failures)
+        return len(rows)
+
+    def _record(self, sent, deferred, failures):
+        retries, failed = [], []
+        for row, error in failures:
+            attempts = row['attempts'] + 1
+            if attempts >= self.max_attempts:
+                logging.error(f"Abandon de l'envoi à {row['recipient']} après {attempts} tentatives: {error}")
+                failed.append((attempts, error, row['id']))
+            else:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                retries.append((attempts, error, f'+{delay} seconds', row['id']))
+
+        conn = database.get_connection()
+        cur = conn.cursor()
+        try:
+            cur.executemany("""
+                UPDATE outbox SET status = 'sent', claim = NULL, sent_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, sent)
+            cur.executemany("""
+                UPDATE outbox SET status = 'queued', claim = NULL, next_attempt_at = datetime('now', %s)
+                WHERE id = %s
+            """, deferred)
+            cur.executemany("""
+                UPDATE outbox
+                SET status = 'queued', claim = NULL, attempts = %s, last_error = %s,
+                    next_attempt_at = datetime('now', %s)
+                WHERE id = %s
+            """, retries)
+            cur.executemany("""
+                UPDATE outbox SET status = 'failed', claim = NULL, attempts = %s, last_error = %s
+                WHERE id = %s
+            """, failed)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+
+mail_sender = MailSender()
@@ -0,0 +1,34 @@
+import streamlit as st
+
+PAGE_SIZE = 25
+
+
+def keyset_pages(key: str, fetch_page, filters=None):
+    """Affiche une page de résultats avec les boutons Précédent / Suivant.
+
+    fetch_page(after) doit retourner (éléments, curseur_suivant) comme les
+    méthodes page() des modèles. Les curseurs des pages déjà vues sont gardés
+    dans la session ; ils sont réinitialisés quand les filtres changent.
+    """
+    cursors_key = f"{key}_cursors"
+    filters_key = f"{key}_filters"
+    if cursors_key not in st.session_state or st.session_state.get(filters_key) != filters:
+        st.session_state[cursors_key] = [None]
+        st.session_state[filters_key] = filters
+    cursors = st.session_state[cursors_key]
+
+    items, next_cursor = fetch_page(cursors[-1])
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if len(cursors) > 1 and st.button("◀ Précédent", key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if next_cursor is not None and st.button("Suivant ▶", key=f"{key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+    return items
@@ -1,28 +1,129 @@
-import io
+import tempfile
 from datetime import datetime
-from reportlab.pdfgen import canvas
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph, Spacer, Table, TableStyle
+
+# Nombre de lignes par bloc de tableau : les lignes sont lues et mises en
+# page par blocs, sans matérialiser tout le tableau. Les pages terminées
+# restent en revanche en mémoire (compressées, de l'ordre de 16 Kio par page)
+# jusqu'à l'écriture du fichier en fin de build : reportlab ne sait pas
+# écrire un PDF page par page.
+TABLE_CHUNK_ROWS = 200
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2b86d9')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f2f6')]),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+class PDFTable:
+    """Tableau d'un rapport : en-tête et lignes lues au fil de l'eau depuis un itérable"""
+
+    def __init__(self, header, rows, title=None):
+        self.header = list(header)
+        self.rows = rows
+        self.title = title
+
+
+class StreamingDocTemplate(BaseDocTemplate):
+    """Document platypus construit à partir d'un générateur de flowables.
+
+    build() de reportlab attend la liste complète des flowables ; ici chaque
+    flowable est mis en page dès qu'il est produit, avec les mêmes étapes
+    que build() (_startBuild / handle_flowable / _endBuild). Le canevas
+    conserve les pages terminées jusqu'à _endBuild(), qui écrit le fichier :
+    la mémoire croît donc avec le nombre de pages, pas avec celui des lignes
+    en attente de mise en page.
+    """
+
+    def __init__(self, filename, onPage=None, **kwargs):
+        super().__init__(filename, **kwargs)
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        template = PageTemplate('report', [frame])
+        if onPage is not None:
+            template.onPage = onPage
+        self.addPageTemplates([template])
+
+    def build_stream(self, flowables):
+        self._startBuild()
+        canv = self.canv
+        canv._doctemplate = self
+        try:
+            pending = []
+            for flowable in flowables:
+                pending.append(flowable)
+                # Un flowable coupé en fin de page est réinséré en tête de liste
+                while pending:
+                    self.clean_hanging()
+                    self.handle_flowable(pending)
+        finally:
+            del canv._doctemplate
+        self._endBuild()
+
 
 class PDFGenerator:
     def __init__(self):
         pass  # Retirer cette ligne si inutile
 
     @staticmethod
-    def generate_pdf_report(data, report_type):
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer)
+    def _flowables(data, report_type, width):
+        styles = getSampleStyleSheet()
+        yield Paragraph(escape(f"Rapport - {report_type}"), styles['Title'])
+        yield Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal'])
+        yield Spacer(1, 0.5 * cm)
 
-        # Header
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, 800, f"Rapport - {report_type}")
-        p.setFont("Helvetica", 12)
-        p.drawString(50, 780, f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-
-        # Content
-        y_position = 750
         for item in data:
-            p.drawString(50, y_position, str(item))
-            y_position -= 20
+            if isinstance(item, PDFTable):
+                if item.title:
+                    yield Spacer(1, 0.3 * cm)
+                    yield Paragraph(escape(item.title), styles['Heading2'])
+                # Largeurs fixes : les blocs successifs restent alignés
+                col_widths = [width / len(item.header)] * len(item.header)
+                rows = iter(item.rows)
+                while chunk := list(islice(rows, TABLE_CHUNK_ROWS)):
+                    table = Table([item.header] + [[str(value) for value in row] for row in chunk],
+                                  colWidths=col_widths, repeatRows=1)
+                    table.setStyle(TABLE_STYLE)
+                    yield table
+            elif item == "":
+                yield Spacer(1, 0.3 * cm)
+            else:
+                yield Paragraph(escape(str(item)), styles['Normal'])
+
+    @staticmethod
+    def write_pdf_report(data, report_type, path):
+        """Écrit le rapport dans le fichier donné.
+
+        data est un itérable de lignes de texte et de PDFTable ; il peut être
+        un générateur, il n'est parcouru qu'une fois.
+        """
+        def number_page(canv, doc):
+            canv.setFont("Helvetica", 8)
+            canv.drawRightString(A4[0] - 1.5 * cm, 1 * cm, f"Page {canv.getPageNumber()}")
+
+        doc = StreamingDocTemplate(
+            path, onPage=number_page, pagesize=A4, pageCompression=1,
+            leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm,
+            title=f"Rapport - {report_type}"
+        )
+        doc.build_stream(PDFGenerator._flowables(data, report_type, doc.width))
+        return path
 
-        p.save()
-        buffer.seek(0)
-        return buffer
+    @staticmethod
+    def generate_pdf_report(data, report_type):
+        """Rapport PDF dans un fichier temporaire, retourné ouvert et rembobiné"""
+        output = tempfile.TemporaryFile(suffix='.pdf')
+        PDFGenerator.write_pdf_report(data, report_type, output)
+        output.seek(0)
+        return output
@@ -0,0 +1,218 @@
+from datetime import date
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+import database
+from utils.cache import load_copy
+from utils.pdf import PDFTable
+
+REPORT_TYPES = ["Présences", "Activités", "Stocks"]
+
+# Tables lues par chaque type de rapport : une écriture sur l'une d'elles
+# (bump_generation) invalide les rapports en cache
+REPORT_TABLES = {
+    "Présences": ('attendance', 'activities', 'users', 'user_notes'),
+    "Activités": ('attendance', 'activities'),
+    "Stocks": ('inventory',),  # chaque mouvement du journal incrémente aussi 'inventory'
+}
+
+
+class Report:
+    """Résultat d'un rapport : indicateurs, série pour le graphique et tableaux détaillés"""
+
+    def __init__(self, report_type: str, start_date: date, end_date: date,
+                 metrics: Dict[str, float], chart: pd.DataFrame, tables: Dict[str, pd.DataFrame]):
+        self.report_type = report_type
+        self.start_date = start_date
+        self.end_date = end_date
+        self.metrics = metrics
+        self.chart = chart
+        self.tables = tables
+
+    def pdf_blocks(self):
+        """Contenu du rapport pour l'export PDF : lignes de texte puis tableaux lus en flux"""
+        yield f"Période du {self.start_date:%d/%m/%Y} au {self.end_date:%d/%m/%Y}"
+        for label, value in self.metrics.items():
+            yield f"{label} : {value}"
+        for title, frame in self.tables.items():
+            yield PDFTable(frame.columns, frame.fillna('').itertuples(index=False), title=title)
+
+
+def _read_frame(query, params, columns):
+    """Charge le résultat d'une requête dans un DataFrame, en un seul aller-retour"""
+    conn = database.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(query, params)
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+    finally:
+        cur.close()
+        conn.close()
+
+
+def _days(start_date, end_date):
+    return pd.date_range(start_date, end_date, freq='D')
+
+
+def _ratio(numerator, denominator):
+    """Division vectorisée, 0 quand le dénominateur est nul"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def _attendance_report(start_date, end_date):
+    activities = _read_frame("""
+        SELECT id, date
+        FROM activities
+        WHERE date BETWEEN %s AND %s
+    """, (start_date, end_date), ['activity_id', 'date'])
+    attendance = _read_frame("""
+        SELECT a.user_id, act.date
+        FROM attendance a
+        JOIN activities act ON act.id = a.activity_id
+        WHERE act.date BETWEEN %s AND %s
+    """, (start_date, end_date), ['user_id', 'date'])
+    cadets = _read_frame("""
+        SELECT id, name, first_name
+        FROM users
+        WHERE status IN ('cadet', 'AMC')
+    """, (), ['user_id', 'name', 'first_name'])
+    notes = _read_frame("""
+        SELECT user_id, rating
+        FROM user_notes
+        WHERE note_date BETWEEN %s AND %s
+    """, (start_date, end_date), ['user_id', 'rating'])
+
+    # Présences par jour, jours sans activité inclus
+    attendance['date'] = pd.to_datetime(attendance['date'])
+    per_day = (attendance.groupby('date').size()
+               .reindex(_days(start_date, end_date), fill_value=0)
+               .rename('présences'))
+
+    # Taux de présence par cadet : présences / activités de la période
+    counts = attendance['user_id'].value_counts()
+    average_rating = notes.groupby('user_id')['rating'].mean()
+    cadets = cadets.set_index('user_id')
+    present = counts.reindex(cadets.index, fill_value=0).to_numpy()
+    per_cadet = pd.DataFrame({
+        'Cadet': (cadets['first_name'].fillna('') + ' ' + cadets['name']).str.strip(),
+        'Présences': present,
+        'Taux de présence (%)': np.round(_ratio(present, len(activities)) * 100, 1),
+        'Note moyenne': average_rating.reindex(cadets.index).round(1),
+    }).sort_values('Taux de présence (%)', ascending=False).reset_index(drop=True)
+
+    metrics = {
+        "Total présences": int(per_day.sum()),
+        "Activités réalisées": len(activities),
+        "Taux de présence moyen (%)": round(float(per_cadet['Taux de présence (%)'].mean()), 1) if len(per_cadet) else 0.0,
+    }
+    return metrics, per_day.to_frame(), {"Présence par cadet": per_cadet}
+
+
+def _activity_report(start_date, end_date):
+    activities = _read_frame("""
+        SELECT act.id, act.name, act.date, act.max_participants, COUNT(a.user_id)
+        FROM activities act
+        LEFT JOIN attendance a ON a.activity_id = act.id
+        WHERE act.date BETWEEN %s AND %s
+        GROUP BY act.id
+        ORDER BY act.date
+    """, (start_date, end_date), ['activity_id', 'Activité', 'Date', 'Places', 'Participants'])
+
+    activities['Remplissage (%)'] = np.round(
+        _ratio(activities['Participants'], activities['Places']) * 100, 1
+    )
+    chart = (activities.assign(date=pd.to_datetime(activities['Date']))
+             .groupby('date')['Remplissage (%)'].mean()
+             .reindex(_days(start_date, end_date))
+             .to_frame())
+
+    metrics = {
+        "Activités réalisées": len(activities),
+        "Participants": int(activities['Participants'].sum()),
+        "Remplissage moyen (%)": round(float(activities['Remplissage (%)'].mean()), 1) if len(activities) else 0.0,
+    }
+    return metrics, chart, {"Remplissage des activités": activities.drop(columns='activity_id')}
+
+
+def _stock_balances(before_date):
+    """Solde de chaque article après son dernier mouvement antérieur à la date donnée"""
+    return _read_frame("""
+        SELECT inventory_id, balance_after
+        FROM stock_movements
+        WHERE id IN (
+            SELECT MAX(id) FROM stock_movements
+            WHERE date(created_at) < %s
+            GROUP BY inventory_id
+        )
+    """, (before_date,), ['inventory_id', 'solde']).set_index('inventory_id')['solde']
+
+
+def _stock_report(start_date, end_date):
+    # Mouvements de la période, lus dans le journal des stocks : approvisionnements,
+    # ajustements, affectations et retours
+    movements = _read_frame("""
+        SELECT inventory_id, date(created_at), movement_type, quantity
+        FROM stock_movements
+        WHERE date(created_at) BETWEEN %s AND %s
+    """, (start_date, end_date), ['inventory_id', 'date', 'type', 'quantity'])
+    items = _read_frame("""
+        SELECT id, item_name, quantity, unit
+        FROM inventory
+    """, (), ['inventory_id', 'Article', 'Stock actuel', 'Unité'])
+
+    movements['date'] = pd.to_datetime(movements['date'])
+    movements['entrées'] = movements['quantity'].clip(lower=0)
+    movements['sorties'] = -movements['quantity'].clip(upper=0)
+    movements['retours'] = movements['quantity'].where(movements['type'] == 'return', 0)
+    per_day = (movements.groupby('date')[['entrées', 'sorties']].sum()
+               .reindex(_days(start_date, end_date), fill_value=0)
+               .rename(columns={'entrées': 'Entrées', 'sorties': 'Sorties'}))
+
+    per_item = movements.groupby('inventory_id')[['entrées', 'sorties']].sum()
+    end_next = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).date().isoformat()
+    balances = pd.DataFrame({
+        'Stock début': _stock_balances(start_date),
+        'Stock fin': _stock_balances(end_next),
+    })
+    stock = (items.set_index('inventory_id')
+             .join(per_item, how='inner')
+             .join(balances, how='left')
+             .fillna({'Stock début': 0})
+             .rename(columns={'entrées': 'Entrées', 'sorties': 'Sorties'})
+             .sort_values('Sorties', ascending=False))
+    stock = stock[['Article', 'Unité', 'Stock début', 'Entrées', 'Sorties', 'Stock fin', 'Stock actuel']]
+
+    metrics = {
+        "Entrées en stock": int(movements['entrées'].sum()),
+        "Dont retours": int(movements['retours'].sum()),
+        "Sorties de stock": int(movements['sorties'].sum()),
+        "Articles concernés": len(stock),
+    }
+    return metrics, per_day, {"Mouvements par article": stock.reset_index(drop=True)}
+
+
+_BUILDERS = {
+    "Présences": _attendance_report,
+    "Activités": _activity_report,
+    "Stocks": _stock_report,
+}
+
+
+def build_report(report_type: str, start_date: date, end_date: date) -> Report:
+    """Rapport de la période, calculé une fois puis servi (copié) depuis le cache des modèles de lecture"""
+    if report_type not in _BUILDERS:
+        raise ValueError(f"Type de rapport inconnu: {report_type}")
+    if start_date > end_date:
+        raise ValueError("La date de début doit précéder la date de fin")
+
+    def load():
+        metrics, chart, tables = _BUILDERS[report_type](start_date.isoformat(), end_date.isoformat())
+        return Report(report_type, start_date, end_date, metrics, chart, tables)
+
+    return load_copy(
+        ('report', report_type, start_date, end_date), REPORT_TABLES[report_type], load
+    )
@@ -0,0 +1,203 @@
+import csv
+import hashlib
+import io
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import database
+from models.Roles import Role
+from utils.validators import validator
+
+# Lignes validées et insérées par transaction
+IMPORT_CHUNK_ROWS = 500
+IMPORT_COLUMNS = ['email', 'nom', 'prenom', 'grade', 'statut', 'mot_de_passe', 'roles', 'parents']
+REQUIRED_COLUMNS = ['email', 'nom', 'statut', 'mot_de_passe']
+USER_STATUSES = ['parent', 'cadet', 'AMC', 'animateur', 'administration']
+MIN_PASSWORD_LENGTH = 6
+
+CSV_TEMPLATE = """email,nom,prenom,grade,statut,mot_de_passe,roles,parents
+parent@example.com,Martin,Claire,,parent,password123,,
+cadet@example.com,Martin,Hugo,Cadet,cadet,password123,role1|role2,parent@example.com"""
+
+
+class ImportReport:
+    """Résultat d'un import : nombre d'utilisateurs créés et erreurs par ligne du fichier"""
+
+    def __init__(self):
+        self.created = 0
+        self.links = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def add_error(self, line: int, message: str):
+        self.errors.append((line, message))
+
+
+def _split(value) -> List[str]:
+    return [part.strip() for part in str(value or '').split('|') if part.strip()]
+
+
+def _read_csv(fileobj) -> Iterator[Tuple[int, dict]]:
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    _check_header(reader.fieldnames or [])
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_xlsx(fileobj) -> Iterator[Tuple[int, dict]]:
+    from openpyxl import load_workbook
+
+    # Mode lecture seule : les lignes sont lues au fil de l'eau, sans charger la feuille
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(value or '').strip() for value in next(rows, ())]
+        _check_header(header)
+        for line, values in enumerate(rows, start=2):
+            if any(value is not None for value in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _check_header(header: List[str]):
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"Colonnes manquantes: {', '.join(missing)}")
+
+
+def read_rows(fileobj, filename: str) -> Iterator[Tuple[int, dict]]:
+    """Lignes (numéro de ligne, valeurs) d'un fichier CSV ou XLSX"""
+    if filename.lower().endswith('.xlsx'):
+        return _read_xlsx(fileobj)
+    return _read_csv(fileobj)
+
+
+def _clean(row: dict) -> dict:
+    return {column: str(row.get(column) or '').strip() for column in IMPORT_COLUMNS}
+
+
+def _validate_chunk(cur, chunk: List[Tuple[int, dict]], roles: Dict[str, int],
+                    seen: set, report: ImportReport) -> List[Tuple[int, dict]]:
+    """Retourne les lignes valides du bloc, les autres sont consignées dans le rapport"""
+    rows = [(line, _clean(row)) for line, row in chunk]
+    emails = [row['email'] for _, row in rows if row['email']]
+    existing = set()
+    if emails:
+        cur.execute(f"""
+            SELECT email FROM users WHERE email IN ({', '.join(['%s'] * len(emails))})
+        """, emails)
+        existing = {email for email, in cur}
+
+    valid = []
+    for line, row in rows:
+        if not row['email'] or not validator.validate_email(row['email']):
+            report.add_error(line, f"Email invalide: {row['email']}")
+        elif row['email'] in existing:
+            report.add_error(line, f"Email déjà utilisé: {row['email']}")
+        elif row['email'] in seen:
+            report.add_error(line, f"Email en double dans le fichier: {row['email']}")
+        elif not row['nom']:
+            report.add_error(line, "Nom manquant")
+        elif row['statut'] not in USER_STATUSES:
+            report.add_error(line, f"Statut inconnu: {row['statut']}")
+        elif len(row['mot_de_passe']) < MIN_PASSWORD_LENGTH:
+            report.add_error(line, f"Le mot de passe doit contenir au moins {MIN_PASSWORD_LENGTH} caractères")
+        elif unknown := [name for name in _split(row['roles']) if name not in roles]:
+            report.add_error(line, f"Rôle(s) inconnu(s): {', '.join(unknown)}")
+        else:
+            seen.add(row['email'])
+            valid.append((line, row))
+    return valid
+
+
+def _insert_chunk(cur, rows: List[Tuple[int, dict]], roles: Dict[str, int]) -> Dict[str, int]:
+    """Insère les utilisateurs et leurs rôles du bloc ; retourne {email: id}"""
+    cur.executemany("""
+        INSERT INTO users (email, password_hash, name, status, first_name, rank)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [
+        (row['email'], hashlib.sha256(row['mot_de_passe'].encode()).hexdigest(), row['nom'],
+         row['statut'], row['prenom'] or None, row['grade'] or None)
+        for _, row in rows
+    ])
+    emails = [row['email'] for _, row in rows]
+    cur.execute(f"""
+        SELECT email, id FROM users WHERE email IN ({', '.join(['%s'] * len(emails))})
+    """, emails)
+    ids = dict(cur.fetchall())
+
+    cur.executemany("""
+        INSERT OR IGNORE INTO user_roles (user_id, role_id) VALUES (%s, %s)
+    """, [(ids[row['email']], roles[name]) for _, row in rows for name in _split(row['roles'])])
+    return ids
+
+
+def _link_parents(cur, links: List[Tuple[int, str, int]]) -> List[Tuple[int, str, int]]:
+    """Crée les associations parent-enfant dont le parent existe ; retourne les autres"""
+    if not links:
+        return []
+    parent_emails = sorted({parent_email for _, parent_email, _ in links})
+    cur.execute(f"""
+        SELECT email, id FROM users WHERE email IN ({', '.join(['%s'] * len(parent_emails))})
+    """, parent_emails)
+    parents = dict(cur.fetchall())
+
+    cur.executemany("""
+        INSERT OR IGNORE INTO parent_child (parent_id, child_id) VALUES (%s, %s)
+    """, [(parents[parent_email], child_id) for _, parent_email, child_id in links
+          if parent_email in parents and parents[parent_email] != child_id])
+    return [link for link in links if link[1] not in parents]
+
+
+def import_users(rows: Iterable[Tuple[int, dict]], chunk_rows: int = IMPORT_CHUNK_ROWS) -> ImportReport:
+    """Importe des utilisateurs par blocs de chunk_rows lignes, une transaction par bloc.
+
+    Chaque bloc est validé avec une seule requête sur les emails existants,
+    puis les utilisateurs, leurs rôles et leurs associations parent-enfant
+    sont insérés par executemany. Une ligne invalide est signalée dans le
+    rapport sans bloquer le reste du fichier ; un parent qui n'apparaît que
+    plus loin dans le fichier est associé après le dernier bloc.
+    """
+    report = ImportReport()
+    roles = {role.name: role.id for role in Role.get_all()}
+    seen = set()
+    pending_links = []
+
+    rows = iter(rows)
+    conn = database.get_connection()
+    cur = conn.cursor()
+    try:
+        while chunk := list(islice(rows, chunk_rows)):
+            valid = _validate_chunk(cur, chunk, roles, seen, report)
+            if not valid:
+                continue
+            try:
+                ids = _insert_chunk(cur, valid, roles)
+                links = [(line, parent_email, ids[row['email']])
+                         for line, row in valid for parent_email in _split(row['parents'])]
+                unresolved = _link_parents(cur, links)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                seen.difference_update(row['email'] for _, row in valid)
+                for line, _ in valid:
+                    report.add_error(line, f"Bloc non importé: {str(e)}")
+                continue
+            report.created += len(valid)
+            report.links += len(links) - len(unresolved)
+            pending_links.extend(unresolved)
+
+        if pending_links:
+            unresolved = _link_parents(cur, pending_links)
+            conn.commit()
+            report.links += len(pending_links) - len(unresolved)
+            for line, parent_email, _ in unresolved:
+                report.add_error(line, f"Utilisateur créé, mais parent introuvable: {parent_email}")
+    finally:
+        cur.close()
+        conn.close()
+
+    if report.created:
+        database.bump_generation('users', 'user_roles')
+    return report